@@ -6,7 +6,10 @@ import numpy as np
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import base64
+import json
 import logging
+import atexit
+import threading
 
 # Setup logging
 logging.basicConfig(
@@ -29,10 +32,16 @@ except Exception as e:
     logger.warning(f"Could not run startup initialization: {e}")
     logger.info("Continuing with manual initialization...")
 
-from database import init_db
-from models import Student, Course, Attendance, Admin, Settings
-from face_recognition_module import FaceRecognitionSystem, process_student_images
-from export_utils import export_attendance_to_excel, export_student_attendance_summary
+from database import init_db, refresh_snapshot, snapshot_age, release_db_connection
+from models import Student, Course, Attendance, Admin, Settings, Dashboard, TodayAttendance
+from export_utils import stream_attendance_csv, stream_attendance_ndjson
+from export_jobs import export_jobs
+from config.settings import (EXPORT_WAIT_SECONDS, REPORTING_SNAPSHOT_PATH, ATTENDANCE_WRITER_ENABLED,
+                             INFERENCE_SOCKET, ENABLE_LIVENESS_DETECTION, PRELOAD_LIVENESS_MODEL)
+from motion_gate import MotionGate
+from inference_executor import InferenceExecutor, ExecutorSaturated
+from inference_server import InferenceClient, InferenceUnavailable
+from attendance_writer import AttendanceWriter, AttendanceQueueFull
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production')
@@ -45,8 +54,59 @@ try:
 except:
     pass
 
-# Global face recognition system
-fr_system = FaceRecognitionSystem()
+# Load today's attendance so duplicate check-ins are answered from memory
+try:
+    TodayAttendance.warm()
+except Exception as e:
+    logger.warning(f"Could not load today's attendance: {e}")
+
+# Local face recognition system (the liveness model loads lazily on first use).
+# With an inference server (INFERENCE_SOCKET) capture recognition runs there,
+# so dlib and the gallery are only loaded here once the live video feed or
+# student enrollment needs them (see get_fr_system)
+fr_system = None
+_fr_system_lock = threading.Lock()
+
+def get_fr_system():
+    """The local face recognition system, built on first use"""
+    global fr_system
+    if fr_system is None:
+        with _fr_system_lock:
+            if fr_system is None:
+                from face_recognition_module import FaceRecognitionSystem
+                fr_system = FaceRecognitionSystem()
+    return fr_system
+
+def liveness_required():
+    """Whether check-ins need blinks counted by the video feed's liveness detector"""
+    if fr_system is None:
+        return ENABLE_LIVENESS_DETECTION
+    return fr_system.enable_liveness
+
+if not INFERENCE_SOCKET:
+    get_fr_system()
+
+# Optionally load the liveness model now so forked workers share it copy-on-write
+# (a model that fails to load turns liveness detection off at startup)
+if PRELOAD_LIVENESS_MODEL:
+    get_fr_system().liveness_ready()
+
+# Bounded worker pool for recognition requests (see inference_executor.py)
+inference_executor = InferenceExecutor()
+
+# Send capture frames to the inference server when one is configured (see inference_server.py)
+recognizer = InferenceClient(INFERENCE_SOCKET) if INFERENCE_SOCKET else get_fr_system()
+
+# Optional write-behind queue for kiosk check-ins/check-outs (see attendance_writer.py)
+attendance_writer = None
+if ATTENDANCE_WRITER_ENABLED:
+    attendance_writer = AttendanceWriter().start().stop_on_sigterm()
+    atexit.register(attendance_writer.stop)
+
+@app.teardown_appcontext
+def release_connection(exception=None):
+    """Hand the request's database connection back to the pool for the next request"""
+    release_db_connection()
 
 def login_required(f):
     """Decorator to require login"""
@@ -75,8 +135,13 @@ def mark_attendance_page():
 def video_feed():
     """Video streaming route for face detection with liveness detection"""
     def generate():
+        # Liveness and the on-screen recognition run locally, even with an inference server
+        fr_system = get_fr_system()
         camera = cv2.VideoCapture(0)
         
+        # Skip detection while nothing in front of the camera changes
+        motion_gate = MotionGate()
+        
         # Reset liveness detector for new session
         if fr_system.enable_liveness and fr_system.liveness_detector:
             fr_system.liveness_detector.reset_blink_counter()
@@ -87,7 +152,12 @@ def video_feed():
                 break
             
             # Detect and recognize face with liveness check
-            student_id, confidence, face_location, is_live = fr_system.recognize_face_from_frame(frame, check_liveness=True)
+            student_id, confidence, face_location = None, None, None
+            if motion_gate.update(frame):
+                student_id, confidence, face_location, is_live = fr_system.recognize_face_from_frame(frame, check_liveness=True)
+                # Any face in view (known or not) keeps the gate open
+                if face_location is not None:
+                    motion_gate.note_face()
             
             # Get blink count if liveness detection is enabled
             blink_count = 0
@@ -122,7 +192,7 @@ def video_feed():
 def get_blink_count():
     """Get current blink count from liveness detector"""
     blink_count = 0
-    if fr_system.enable_liveness and fr_system.liveness_detector:
+    if fr_system is not None and fr_system.enable_liveness and fr_system.liveness_detector:
         blink_count = fr_system.liveness_detector.total_blinks
     return jsonify({'blink_count': blink_count})
 
@@ -138,7 +208,7 @@ def capture_attendance():
         return jsonify({'success': False, 'message': 'Course code required'})
     
     # Check liveness requirement
-    if fr_system.enable_liveness and blink_count < 1:
+    if liveness_required() and blink_count < 1:
         return jsonify({
             'success': False, 
             'message': 'Liveness check failed. Please blink naturally and try again.',
@@ -154,7 +224,20 @@ def capture_attendance():
         return jsonify({'success': False, 'message': 'Failed to capture image'})
     
     # Recognize face (skip liveness check here as it's already done)
-    student_id, confidence, face_location, _ = fr_system.recognize_face_from_frame(frame, check_liveness=False)
+    try:
+        student_id, confidence, face_location, _ = inference_executor.run(
+            recognizer.recognize_face_from_frame, frame, check_liveness=False)
+    except ExecutorSaturated as e:
+        response = jsonify({
+            'success': False,
+            'message': 'The system is busy. Please try again in a moment.',
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    except InferenceUnavailable as e:
+        logger.error(f"Recognition failed: {e}")
+        return jsonify({'success': False, 'message': 'Face recognition is unavailable. Please try again.'}), 503
     
     if not student_id or confidence < 0.5:
         return jsonify({'success': False, 'message': 'Face not recognized. Please try again.'})
@@ -162,10 +245,25 @@ def capture_attendance():
     # Get student details
     student = Student.get_student_by_id(student_id)
     
+    # Go through the write-behind queue when it is enabled
+    attendance = attendance_writer or Attendance
+    
+    try:
+        if action == 'check_in':
+            success = attendance.check_in(student_id, course_code)
+        elif action == 'check_out':
+            success, status = attendance.check_out(student_id, course_code)
+    except AttendanceQueueFull as e:
+        response = jsonify({
+            'success': False,
+            'message': 'The system is busy. Please try again in a moment.',
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    
     if action == 'check_in':
         # Check in
-        success = Attendance.check_in(student_id, course_code)
-        
         if success:
             return jsonify({
                 'success': True, 
@@ -177,7 +275,7 @@ def capture_attendance():
             })
         else:
             # Check if already checked in
-            status = Attendance.get_today_status(student_id, course_code)
+            status = attendance.get_today_status(student_id, course_code)
             if status:
                 if status['check_out_time']:
                     return jsonify({
@@ -204,8 +302,6 @@ def capture_attendance():
     
     elif action == 'check_out':
         # Check out
-        success, status = Attendance.check_out(student_id, course_code)
-        
         if success:
             return jsonify({
                 'success': True, 
@@ -224,6 +320,38 @@ def capture_attendance():
                 'student_id': student_id
             })
 
+@app.route('/api/attendance/batch', methods=['POST'])
+@login_required
+def batch_attendance():
+    """
+    Check in / check out many students at once (group capture, offline video)
+
+    Body: {"entries": [{"student_id": ..., "course_code": ..., "action": "check_in" | "check_out",
+                        "timestamp": optional ISO datetime}, ...]}
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('entries')
+    if not isinstance(items, list):
+        return jsonify({'success': False, 'message': 'A list of entries is required'}), 400
+
+    entries = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('student_id') or not item.get('course_code'):
+            return jsonify({'success': False,
+                            'message': f'Entry {index}: student_id and course_code are required'}), 400
+        try:
+            timestamp = datetime.fromisoformat(item['timestamp']) if item.get('timestamp') else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': f'Entry {index}: invalid timestamp'}), 400
+        entries.append((item['student_id'], item['course_code'], item.get('action', 'check_in'), timestamp))
+
+    results = Attendance.batch_attendance(entries)
+    return jsonify({
+        'success': True,
+        'processed': sum(1 for result in results if result['success']),
+        'results': results
+    })
+
 # ============= ADMIN ROUTES =============
 
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -252,18 +380,26 @@ def logout():
 @login_required
 def admin_dashboard():
     """Admin dashboard"""
-    total_students = len(Student.get_all_students())
-    total_courses = len(Course.get_all_courses())
-    total_attendance = len(Attendance.get_all_attendance())
-    
-    # Get recent attendance
-    recent_attendance = Attendance.get_all_attendance()[:10]
+    stats = Dashboard.get_stats()
     
     return render_template('admin_dashboard.html', 
-                         total_students=total_students,
-                         total_courses=total_courses,
-                         total_attendance=total_attendance,
-                         recent_attendance=recent_attendance)
+                         total_students=stats['total_students'],
+                         total_courses=stats['total_courses'],
+                         total_attendance=stats['total_attendance'],
+                         recent_attendance=stats['recent_attendance'],
+                         today_by_course=stats['today_by_course'])
+
+@app.route('/admin/api/dashboard-stats')
+@login_required
+def dashboard_stats():
+    """Dashboard statistics as JSON"""
+    return jsonify(Dashboard.get_stats())
+
+@app.route('/admin/api/inference-stats')
+@login_required
+def inference_stats():
+    """Recognition pool load, rejections and queue-wait/service latencies as JSON"""
+    return jsonify(inference_executor.get_stats())
 
 # ============= STUDENT MANAGEMENT =============
 
@@ -300,11 +436,13 @@ def add_student():
             file.save(filepath)
             
             # Process and train face
+            from face_recognition_module import process_student_images
             success = process_student_images(student_id, name, email, phone, filepath)
             
             if success:
-                # Reload face recognition system
-                fr_system.load_known_faces()
+                # Reload face recognition system (other processes pick the student up on their next check)
+                if fr_system is not None:
+                    fr_system.load_known_faces()
                 return redirect(url_for('manage_students'))
             else:
                 return render_template('add_student.html', 
@@ -336,7 +474,8 @@ def edit_student(student_id):
 def delete_student(student_id):
     """Delete student"""
     Student.delete_student(student_id)
-    fr_system.load_known_faces()
+    if fr_system is not None:
+        fr_system.load_known_faces()
     return redirect(url_for('manage_students'))
 
 # ============= COURSE MANAGEMENT =============
@@ -404,33 +543,97 @@ def delete_course(course_code):
 
 # ============= ATTENDANCE MANAGEMENT =============
 
+ATTENDANCE_FILTERS = ('student_id', 'course_code', 'status', 'date_from', 'date_to')
+ATTENDANCE_STATUSES = ('Checked In', 'Present', 'Absent (Left Early)')
+
+def encode_page_cursor(key):
+    """Turn a (date, check_in_time, id) page key into an opaque URL token"""
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+def decode_page_cursor(token):
+    """Turn a URL token back into a page key (None if missing or invalid)"""
+    if not token:
+        return None
+    try:
+        date_value, time_value, record_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return str(date_value), str(time_value), int(record_id)
+    except (ValueError, TypeError):
+        return None
+
+def get_attendance_page_from_request(**fixed_filters):
+    """
+    Load one page of attendance using the filters and cursor in the query string
+    
+    Returns:
+        tuple: (records, next_cursor, filters)
+    """
+    filters = {name: request.args.get(name) or None for name in ATTENDANCE_FILTERS}
+    filters.update(fixed_filters)
+    limit = min(max(request.args.get('limit', type=int, default=50), 1), 500)
+    after = decode_page_cursor(request.args.get('after'))
+    
+    records, next_key = Attendance.get_attendance_page(after=after, limit=limit, **filters)
+    return records, encode_page_cursor(next_key), filters
+
+def get_page_urls(next_cursor):
+    """
+    Build the "next page" and "first page" links for the current page
+    
+    Returns:
+        tuple: (next_url, first_url) - None when there is no such page
+    """
+    view_args = request.view_args or {}
+    # Path arguments and the cursor come from the route, not the query string
+    args = {key: value for key, value in request.args.items() if key != 'after' and key not in view_args}
+    
+    next_url = url_for(request.endpoint, **view_args, **args, after=next_cursor) if next_cursor else None
+    first_url = url_for(request.endpoint, **view_args, **args) if request.args.get('after') else None
+    return next_url, first_url
+
 @app.route('/admin/attendance')
 @login_required
 def view_attendance():
-    """View all attendance records"""
-    attendance_records = Attendance.get_all_attendance()
-    return render_template('view_attendance.html', records=attendance_records)
+    """View attendance records, one filtered page at a time"""
+    attendance_records, next_cursor, filters = get_attendance_page_from_request()
+    next_url, first_url = get_page_urls(next_cursor)
+    return render_template('view_attendance.html', 
+                         records=attendance_records,
+                         next_url=next_url,
+                         first_url=first_url,
+                         filters=filters,
+                         courses=Course.get_all_courses(),
+                         statuses=ATTENDANCE_STATUSES)
+
+@app.route('/admin/api/attendance')
+@login_required
+def attendance_api():
+    """Attendance records as JSON, with the same filters and cursor as the pages"""
+    attendance_records, next_cursor, filters = get_attendance_page_from_request()
+    return jsonify({
+        'records': [dict(record) for record in attendance_records],
+        'next_cursor': next_cursor
+    })
 
 @app.route('/admin/attendance/student/<student_id>')
 @login_required
 def view_student_attendance(student_id):
     """View attendance for a specific student"""
     student = Student.get_student_by_id(student_id)
-    attendance_records = Attendance.get_attendance_by_student(student_id)
-    courses = Course.get_all_courses()
+    attendance_records, next_cursor, _ = get_attendance_page_from_request(student_id=student_id)
+    next_url, first_url = get_page_urls(next_cursor)
     
-    # Calculate percentages
-    percentages = {}
-    for course in courses:
-        percentages[course['course_code']] = Attendance.get_student_attendance_percentage(
-            student_id, course['course_code']
-        )
+    # Calculate percentages for every course in one query
+    percentages = Attendance.get_attendance_percentages(student_id=student_id)
     
     threshold = Settings.get_min_attendance_percentage()
     
     return render_template('student_attendance.html', 
                          student=student,
                          records=attendance_records,
+                         next_url=next_url,
+                         first_url=first_url,
                          percentages=percentages,
                          threshold=threshold)
 
@@ -439,42 +642,130 @@ def view_student_attendance(student_id):
 def view_course_attendance(course_code):
     """View attendance for a specific course"""
     course = Course.get_course_by_code(course_code)
-    attendance_records = Attendance.get_attendance_by_course(course_code)
+    attendance_records, next_cursor, _ = get_attendance_page_from_request(course_code=course_code)
+    next_url, first_url = get_page_urls(next_cursor)
     return render_template('course_attendance.html', 
                          course=course,
-                         records=attendance_records)
+                         records=attendance_records,
+                         next_url=next_url,
+                         first_url=first_url)
 
 # ============= EXPORT ROUTES =============
 
+def serve_export_job(job):
+    """Send a finished export, or a page that polls until it is ready"""
+    if not job.finished.is_set():
+        export_jobs.wait(job, EXPORT_WAIT_SECONDS)
+    
+    if job.status == 'done':
+        if not os.path.exists(job.filename):
+            # Removed since (by a newer export in another process): build it again
+            return serve_export_job(export_jobs.submit(job.export_type, **job.params))
+        return send_file(os.path.abspath(job.filename), as_attachment=True,
+                         download_name=job.download_name)
+    elif job.status == 'empty':
+        return "No data to export", 404
+    elif job.status == 'failed':
+        return f"Export failed: {job.error}", 500
+    else:
+        return render_template('export_pending.html', job=job), 202
+
 @app.route('/admin/export/attendance')
 @login_required
 def export_attendance():
     """Export all attendance to Excel"""
-    filename = export_attendance_to_excel()
-    if filename:
-        return send_file(filename, as_attachment=True)
-    else:
-        return "No data to export", 404
+    return serve_export_job(export_jobs.submit('attendance', course_code=None))
 
 @app.route('/admin/export/attendance/<course_code>')
 @login_required
 def export_course_attendance(course_code):
     """Export course attendance to Excel"""
-    filename = export_attendance_to_excel(course_code)
-    if filename:
-        return send_file(filename, as_attachment=True)
+    return serve_export_job(export_jobs.submit('attendance', course_code=course_code))
+
+@app.route('/admin/export/jobs', methods=['POST'])
+@login_required
+def create_export_job():
+    """Queue an export job (export_type=attendance|summary, optional course_code)"""
+    data = request.get_json(silent=True) or request.form
+    export_type = data.get('export_type', 'attendance')
+    
+    if export_type == 'attendance':
+        params = {'course_code': data.get('course_code') or None}
+    elif export_type == 'summary':
+        params = {}
     else:
-        return "No data to export", 404
+        return jsonify({'success': False, 'message': 'Unknown export type'}), 400
+    
+    job = export_jobs.submit(export_type, **params)
+    return jsonify(job.to_dict()), 202
+
+@app.route('/admin/export/jobs/<job_id>')
+@login_required
+def export_job_status(job_id):
+    """Status of an export job"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown export job'}), 404
+    
+    status = job.to_dict()
+    if job.status == 'done':
+        status['download_url'] = url_for('download_export_job', job_id=job.id)
+    return jsonify(status)
+
+@app.route('/admin/export/jobs/<job_id>/download')
+@login_required
+def download_export_job(job_id):
+    """Download the file of an export job, waiting briefly if it is still running"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return "Unknown export job", 404
+    return serve_export_job(job)
+
+@app.route('/admin/export/stream/attendance.<fmt>')
+@login_required
+def export_attendance_stream(fmt):
+    """Stream attendance as CSV or NDJSON (optionally ?course_code=...)"""
+    course_code = request.args.get('course_code') or None
+    today = datetime.now().strftime('%Y-%m-%d')
+    name = f"attendance_{course_code or 'all'}_{today}.{fmt}"
+    
+    if fmt == 'csv':
+        body, mimetype = stream_attendance_csv(course_code), 'text/csv'
+    elif fmt == 'ndjson':
+        body, mimetype = stream_attendance_ndjson(course_code), 'application/x-ndjson'
+    else:
+        return "Unsupported export format", 404
+    
+    return Response(body, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{name}"'})
 
 @app.route('/admin/export/summary')
 @login_required
 def export_summary():
     """Export attendance summary to Excel"""
-    filename = export_student_attendance_summary()
-    if filename:
-        return send_file(filename, as_attachment=True)
-    else:
-        return "No data to export", 404
+    return serve_export_job(export_jobs.submit('summary'))
+
+@app.route('/admin/reporting/snapshot', methods=['GET', 'POST'])
+@login_required
+def reporting_snapshot():
+    """Show the age of the reporting snapshot file, or refresh it (POST, ?force=true to always copy)"""
+    if not REPORTING_SNAPSHOT_PATH or REPORTING_SNAPSHOT_PATH == ':memory:':
+        return jsonify({'success': False,
+                        'message': 'No reporting snapshot file configured (REPORTING_SNAPSHOT_PATH)'}), 400
+    
+    refreshed = None
+    if request.method == 'POST':
+        try:
+            refreshed = refresh_snapshot(force=request.args.get('force', 'false').lower() == 'true')
+        except Exception as e:
+            logger.error(f"Reporting snapshot refresh failed: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+    
+    return jsonify({
+        'success': True,
+        'refreshed': refreshed,
+        'age_seconds': snapshot_age()
+    })
 
 # ============= SETTINGS =============
 
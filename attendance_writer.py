@@ -0,0 +1,359 @@
+"""
+Attendance Writer
+Write-behind queue for check-ins and check-outs: requests are answered from
+memory and a single writer thread commits them to the database in batches
+"""
+
+import logging
+import math
+import queue
+import signal
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+from config.settings import (ATTENDANCE_WRITER_FLUSH_INTERVAL, ATTENDANCE_WRITER_MAX_BATCH,
+                             ATTENDANCE_WRITER_QUEUE_SIZE, ATTENDANCE_WRITER_WAIT_FOR_COMMIT,
+                             ATTENDANCE_WRITER_SYNCHRONOUS)
+from database import get_db_connection, close_db_connection
+from models import Attendance, Course, TodayAttendance
+
+logger = logging.getLogger(__name__)
+
+
+class AttendanceQueueFull(Exception):
+    """Raised when the queue is full and the writer can't take another event"""
+    
+    def __init__(self, retry_after):
+        super().__init__(f"Attendance queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AttendanceEvent:
+    """A check-in or check-out waiting to be committed"""
+    
+    def __init__(self, student_id, course_code, action, timestamp, outcome):
+        self.student_id = student_id
+        self.course_code = course_code
+        self.action = action
+        self.timestamp = timestamp
+        self.outcome = outcome  # Outcome given to the caller from memory
+        self.result = None  # Outcome from the database once committed
+        self.error = False  # True if the event could not be committed
+        self.committed = threading.Event()
+
+
+class AttendanceWriter:
+    """
+    Write-behind queue for attendance events
+    
+    Duplicate check-ins and check-outs are answered from memory: the shared
+    TodayAttendance index holds committed records and the writer keeps the
+    records of events still in the queue. Accepted events go into a bounded
+    queue that one writer
+    thread drains with Attendance.batch_attendance(), committing up to
+    max_batch events at a time after waiting at most flush_interval seconds
+    for a batch to fill.
+    
+    A full queue is not waited on: the event is turned away with
+    AttendanceQueueFull so the caller can answer "busy" right away.
+    
+    Usage:
+        writer = AttendanceWriter().start()
+        try:
+            writer.check_in(student_id, course_code)
+        except AttendanceQueueFull as e:
+            ...  # Answer 429 with Retry-After: e.retry_after
+        writer.stop()  # Commits everything still queued
+    """
+    
+    # Attempts to commit a batch before reporting its events as failed
+    MAX_RETRIES = 3
+    
+    # Seconds a SIGTERM waits for the queue to be committed
+    SHUTDOWN_TIMEOUT = 10
+    
+    def __init__(self, flush_interval=ATTENDANCE_WRITER_FLUSH_INTERVAL, max_batch=ATTENDANCE_WRITER_MAX_BATCH,
+                 queue_size=ATTENDANCE_WRITER_QUEUE_SIZE, wait_for_commit=ATTENDANCE_WRITER_WAIT_FOR_COMMIT,
+                 synchronous=ATTENDANCE_WRITER_SYNCHRONOUS):
+        """
+        Args:
+            flush_interval: Seconds to gather events before committing a batch
+            max_batch: Most events committed in one transaction
+            queue_size: Most events waiting to be committed
+            wait_for_commit: Make callers wait until their event is committed
+                             (group commit) instead of answering once queued
+            synchronous: synchronous pragma of the writer's connection
+                         ('FULL' syncs every batch commit to disk)
+        """
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.wait_for_commit = wait_for_commit
+        self.synchronous = synchronous
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.day = None
+        self.pending = {}  # (student_id, course_code, day) -> [record, queued events]
+        self.min_durations = {}
+        self.thread = None
+        self.stopped = False
+        self.dead = False  # The writer thread exited unexpectedly
+        self.stats = {'queued': 0, 'committed': 0, 'batches': 0, 'failed': 0, 'rejected': 0}
+    
+    def start(self):
+        """Start the writer thread"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+            self.thread.start()
+        return self
+    
+    def _record(self, student_id, course_code, day):
+        """A student's record for the day, including queued events (caller holds the lock)"""
+        pending = self.pending.get((student_id, course_code, day))
+        if pending is not None:
+            return pending[0]
+        return TodayAttendance.get(student_id, course_code)
+    
+    def _min_duration(self, course_code, day):
+        """Minimum minutes to count as present in a course (called without the lock)"""
+        if day != self.day:
+            # New day: course settings may have changed
+            self.min_durations = {}
+            self.day = day
+        
+        min_duration = self.min_durations.get(course_code)
+        if min_duration is None:
+            course = Course.get_course_by_code(course_code)
+            min_duration = course['min_duration_minutes'] if course else 45
+            self.min_durations[course_code] = min_duration
+        return min_duration
+    
+    def submit(self, student_id, course_code, action):
+        """
+        Record a check-in or check-out
+        
+        Args:
+            student_id: Student ID
+            course_code: Course code
+            action: 'check_in' or 'check_out'
+        
+        Returns:
+            dict: success, outcome, status and message as returned by
+                  Attendance.batch_attendance()
+        
+        Raises:
+            AttendanceQueueFull: If the queue is full (the event is not recorded)
+        """
+        timestamp = datetime.now()
+        day = timestamp.date().isoformat()
+        
+        # Database reads happen before taking the lock, so one slow query
+        # doesn't hold up every other kiosk
+        min_duration = self._min_duration(course_code, day)
+        with self.lock:
+            queued = (student_id, course_code, day) in self.pending
+        if not queued and TodayAttendance.get(student_id, course_code) is None:
+            # Nothing in memory: another process may have written the record
+            TodayAttendance.reload(student_id, course_code)
+        
+        with self.lock:
+            write_through = self.stopped or self.dead
+            if not write_through:
+                outcome, record, change = Attendance.apply_action(
+                    self._record(student_id, course_code, day), action, timestamp, min_duration)
+                if change is None:
+                    # Duplicate or invalid: nothing to write
+                    return outcome
+                
+                event = AttendanceEvent(student_id, course_code, action, timestamp, outcome)
+                try:
+                    # Queue while holding the lock so events keep their order
+                    self.queue.put_nowait(event)
+                except queue.Full:
+                    self.stats['rejected'] += 1
+                    retry_after = max(1, math.ceil(self.flush_interval * self.queue.maxsize / self.max_batch))
+                    logger.warning(f"Attendance event rejected: {self.queue.maxsize} event(s) queued")
+                    raise AttendanceQueueFull(retry_after)
+                
+                pending = self.pending.setdefault((student_id, course_code, day), [record, 0])
+                pending[0] = record
+                pending[1] += 1
+                self.stats['queued'] += 1
+        
+        if write_through:
+            # Shutting down (or the writer thread died): write through directly,
+            # once the events still queued are committed so they keep their order
+            if self.thread is not None and self.thread is not threading.current_thread():
+                self.thread.join(self.SHUTDOWN_TIMEOUT)
+            return Attendance.batch_attendance([(student_id, course_code, action)])[0]
+        
+        if self.wait_for_commit:
+            event.committed.wait()
+            return event.result
+        return outcome
+    
+    def check_in(self, student_id, course_code):
+        """Check in a student (same result as Attendance.check_in)"""
+        return self.submit(student_id, course_code, 'check_in')['success']
+    
+    def check_out(self, student_id, course_code):
+        """Check out a student (same result as Attendance.check_out)"""
+        result = self.submit(student_id, course_code, 'check_out')
+        return result['success'], result['status'] if result['success'] else result['message']
+    
+    def get_today_status(self, student_id, course_code):
+        """Today's record of a student in a course, including events not yet committed"""
+        with self.lock:
+            return self._record(student_id, course_code, date.today().isoformat())
+    
+    def _run(self):
+        """Writer thread: commit queued events in batches until stopped"""
+        try:
+            self._drain()
+        except Exception:
+            logger.exception("Attendance writer thread failed; writing through directly from now on")
+            self._abandon()
+        finally:
+            close_db_connection()
+    
+    def _drain(self):
+        """Take batches off the queue and commit them until stop() is called"""
+        get_db_connection().execute(f'PRAGMA synchronous = {self.synchronous}')
+        
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch and batch[-1] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            # None is queued by stop() after the last event
+            events = [event for event in batch if event is not None]
+            stopping = len(events) < len(batch)
+            if events:
+                self._flush(events)
+    
+    def _abandon(self):
+        """Fail every event still queued after the writer thread died"""
+        with self.lock:
+            # submit() writes through from now on, so nothing more is queued
+            self.dead = True
+        
+        events = []
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if event is not None:
+                events.append(event)
+        self._finish(events, None)
+    
+    def _flush(self, events):
+        """Commit a batch of events and hand the results to waiting callers"""
+        entries = [(event.student_id, event.course_code, event.action, event.timestamp) for event in events]
+        
+        results = None
+        for attempt in range(1, self.MAX_RETRIES + 1):
+            try:
+                results = Attendance.batch_attendance(entries)
+                break
+            except sqlite3.Error as e:
+                logger.warning(f"Attendance batch of {len(events)} event(s) failed (attempt {attempt}): {e}")
+                time.sleep(0.1 * attempt)
+            except Exception:
+                # Not a database hiccup: retrying won't help
+                logger.exception(f"Attendance batch of {len(events)} event(s) failed")
+                break
+        
+        if results is None:
+            logger.error(f"Dropped {len(events)} attendance event(s)")
+        self._finish(events, results)
+    
+    def _finish(self, events, results):
+        """
+        Release the pending records of a batch and hand the results to waiting callers
+        
+        Args:
+            events: Events of the batch
+            results: Results of Attendance.batch_attendance(), or None if the
+                     batch could not be committed
+        """
+        failed = results is None
+        if failed:
+            results = [{'success': False, 'outcome': 'failed', 'status': None,
+                        'message': 'Failed to save attendance'}] * len(events)
+            self.stats['failed'] += len(events)
+        else:
+            self.stats['committed'] += sum(1 for result in results if result['success'])
+        self.stats['batches'] += 1
+        
+        # The batch is in the database (and TodayAttendance) now, or was dropped
+        with self.lock:
+            for event in events:
+                key = (event.student_id, event.course_code, event.timestamp.date().isoformat())
+                pending = self.pending.get(key)
+                if pending is None:
+                    continue
+                pending[1] -= 1
+                if pending[1] == 0:
+                    del self.pending[key]
+        
+        # Re-read records the database disagreed with (e.g. written by another
+        # process) or whose events were dropped, so the next answer is right
+        stale = {(event.student_id, event.course_code) for event, result in zip(events, results)
+                 if result['outcome'] != event.outcome['outcome']}
+        if stale:
+            logger.warning(f"{len(stale)} attendance record(s) differed from the database, reloading")
+            for student_id, course_code in stale:
+                try:
+                    TodayAttendance.reload(student_id, course_code)
+                except Exception as e:
+                    logger.warning(f"Could not reload attendance of {student_id} in {course_code}: {e}")
+        
+        for event, result in zip(events, results):
+            event.result = dict(result)
+            event.error = failed
+            event.committed.set()
+    
+    def stop_on_sigterm(self):
+        """
+        Commit the queue before the process exits on SIGTERM (e.g. docker stop),
+        which doesn't run atexit handlers, then hand over to the previous handler
+        """
+        previous = signal.getsignal(signal.SIGTERM)
+        
+        def handle_sigterm(signum, frame):
+            # Stop from another thread: the interrupted thread may hold self.lock
+            stopper = threading.Thread(target=self.stop, name='attendance-writer-stop')
+            stopper.start()
+            stopper.join(self.SHUTDOWN_TIMEOUT)
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                raise SystemExit(128 + signum)
+        
+        try:
+            signal.signal(signal.SIGTERM, handle_sigterm)
+        except ValueError:
+            # Only the main thread can install signal handlers
+            logger.warning("Attendance writer: SIGTERM handler not installed (not the main thread)")
+        return self
+    
+    def stop(self, timeout=None):
+        """Stop the writer after committing every queued event"""
+        with self.lock:
+            if self.stopped:
+                return
+            self.stopped = True
+        
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
@@ -21,17 +21,64 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 # Database Configuration
 DATABASE_PATH = BASE_DIR / 'attendance.db'
 
+# SQLite Connection Configuration
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))  # negative = KiB (16 MB)
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+# Idle connections kept for reuse by the next request's thread
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))
+
+# Reporting Snapshot Configuration
+# Empty: reports read the live database inside one WAL read transaction
+# ':memory:': each report reads a private in-memory copy of the database
+# A file path: reports read a read-only backup copy refreshed when older than the max age
+REPORTING_SNAPSHOT_PATH = os.environ.get('REPORTING_SNAPSHOT_PATH', '')
+REPORTING_SNAPSHOT_MAX_AGE = float(os.environ.get('REPORTING_SNAPSHOT_MAX_AGE', 300))
+REPORTING_SNAPSHOT_PAGES = int(os.environ.get('REPORTING_SNAPSHOT_PAGES', 1024))  # pages copied per backup step
+
+# Attendance Writer Configuration (background write-behind queue for check-ins/check-outs)
+ATTENDANCE_WRITER_ENABLED = os.environ.get('ATTENDANCE_WRITER_ENABLED', 'False').lower() == 'true'
+ATTENDANCE_WRITER_FLUSH_INTERVAL = float(os.environ.get('ATTENDANCE_WRITER_FLUSH_INTERVAL', 0.05))  # seconds
+ATTENDANCE_WRITER_MAX_BATCH = int(os.environ.get('ATTENDANCE_WRITER_MAX_BATCH', 200))
+ATTENDANCE_WRITER_QUEUE_SIZE = int(os.environ.get('ATTENDANCE_WRITER_QUEUE_SIZE', 1000))
+# True: callers wait until their batch is committed; False: acknowledged once queued
+ATTENDANCE_WRITER_WAIT_FOR_COMMIT = os.environ.get('ATTENDANCE_WRITER_WAIT_FOR_COMMIT', 'False').lower() == 'true'
+# synchronous pragma of the writer's connection (FULL = fsync on every batch commit)
+ATTENDANCE_WRITER_SYNCHRONOUS = os.environ.get('ATTENDANCE_WRITER_SYNCHRONOUS', 'FULL')
+
 # Export Configuration
 EXPORT_FOLDER = BASE_DIR / 'exports'
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+EXPORT_WAIT_SECONDS = float(os.environ.get('EXPORT_WAIT_SECONDS', 10))
 
 # Face Recognition Configuration
 FACE_RECOGNITION_TOLERANCE = 0.6
 FACE_RECOGNITION_MODEL = 'hog'  # or 'cnn' for better accuracy (slower)
+# Recognition worker pool: calls running at once (about one per core) and calls
+# allowed to wait for a worker before requests are answered with 429
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', os.cpu_count() or 1))
+INFERENCE_QUEUE_SIZE = int(os.environ.get('INFERENCE_QUEUE_SIZE', 8))
+# Optional inference server (inference_server.py): web workers send frames to
+# this Unix socket instead of running recognition themselves
+INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET', '')
+INFERENCE_SERVER_WORKERS = int(os.environ.get('INFERENCE_SERVER_WORKERS', os.cpu_count() or 1))
+# Frames recognized together, and the longest a frame waits for a batch to fill
+# (0: batch only the frames that queued up while the previous batch ran)
+INFERENCE_BATCH_SIZE = int(os.environ.get('INFERENCE_BATCH_SIZE', 8))
+INFERENCE_BATCH_WAIT_MS = float(os.environ.get('INFERENCE_BATCH_WAIT_MS', 0))
+INFERENCE_CLIENT_TIMEOUT = float(os.environ.get('INFERENCE_CLIENT_TIMEOUT', 10))
+# Milliseconds between checks for students added, changed or removed by other workers
+GALLERY_CHECK_INTERVAL_MS = int(os.environ.get('GALLERY_CHECK_INTERVAL_MS', 1000))
 
 # Liveness Detection Configuration
 ENABLE_LIVENESS_DETECTION = True
 LIVENESS_MODEL_PATH = BASE_DIR / 'shape_predictor_68_face_landmarks.dat'
 LIVENESS_MODEL_URL = 'http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2'
+# Load the liveness model at startup instead of on first use, e.g. so workers
+# forked by gunicorn --preload share it copy-on-write
+PRELOAD_LIVENESS_MODEL = os.environ.get('PRELOAD_LIVENESS_MODEL', 'False').lower() == 'true'
 
 # Default Settings
 DEFAULT_MIN_ATTENDANCE_PERCENTAGE = 75
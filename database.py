@@ -1,15 +1,457 @@
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 import os
+import threading
+import time
+from pathlib import Path
+
+from config.settings import (SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE,
+                             SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_POOL_SIZE, REPORTING_SNAPSHOT_PATH,
+                             REPORTING_SNAPSHOT_MAX_AGE, REPORTING_SNAPSHOT_PAGES)
 
 DATABASE_PATH = 'attendance_system.db'
 
+# One reusable connection per thread
+_local = threading.local()
+
+# Connections handed back by finished requests: (connection, pid, database path)
+_idle_connections = []
+_idle_lock = threading.Lock()
+
+# Serializes reporting snapshot refreshes within this process
+_snapshot_lock = threading.Lock()
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Connection kept open and reused by its thread
+    
+    close() hands the connection back (rolling back anything left uncommitted)
+    instead of closing it, and commit() is deferred while a transaction()
+    block is active so multi-statement operations stay atomic.
+    """
+    transaction_depth = 0
+    
+    def commit(self):
+        if self.transaction_depth == 0:
+            super().commit()
+    
+    def close(self):
+        if self.transaction_depth == 0 and self.in_transaction:
+            self.rollback()
+    
+    def close_connection(self):
+        """Really close the underlying SQLite connection"""
+        super().close()
+
+# Indexes backing the attendance reporting queries in models.py
+ATTENDANCE_INDEXES = [
+    ('idx_attendance_date', 'attendance(date, check_in_time)'),
+    ('idx_attendance_course_date', 'attendance(course_code, date, check_in_time)'),
+    ('idx_attendance_student_date', 'attendance(student_id, date, check_in_time)'),
+    ('idx_attendance_student_course_status', 'attendance(student_id, course_code, status)'),
+]
+
+def create_indexes(cursor):
+    """Create the reporting indexes if they don't exist yet"""
+    for name, columns in ATTENDANCE_INDEXES:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {columns}')
+
+# attendance_summary rows as computed from the attendance table
+ATTENDANCE_SUMMARY_QUERY = '''
+    SELECT student_id, course_code,
+           SUM(status = 'Present') AS attended,
+           SUM(status = 'Absent (Left Early)') AS left_early,
+           MAX(date) AS last_seen
+    FROM attendance
+    WHERE status IN ('Present', 'Absent (Left Early)')
+    GROUP BY student_id, course_code
+'''
+
+def create_attendance_summary(cursor):
+    """
+    Create the attendance_summary table, filling it from attendance if it is new
+    
+    The table keeps per student and course the number of classes attended,
+    the number left early and the last date either happened, and is updated
+    by every check-out, so percentages don't need to scan attendance.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance_summary'")
+    exists = cursor.fetchone() is not None
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_summary (
+            student_id TEXT NOT NULL,
+            course_code TEXT NOT NULL,
+            attended INTEGER NOT NULL DEFAULT 0,
+            left_early INTEGER NOT NULL DEFAULT 0,
+            last_seen DATE,
+            PRIMARY KEY (student_id, course_code)
+        ) WITHOUT ROWID
+    ''')
+    
+    if not exists:
+        rebuild_attendance_summary(cursor)
+
+def rebuild_attendance_summary(cursor):
+    """
+    Recompute attendance_summary from the attendance table
+    
+    Returns:
+        int: number of summary rows written
+    """
+    cursor.execute('DELETE FROM attendance_summary')
+    cursor.execute(f'''
+        INSERT INTO attendance_summary (student_id, course_code, attended, left_early, last_seen)
+        {ATTENDANCE_SUMMARY_QUERY}
+    ''')
+    return cursor.rowcount
+
+# Tables whose writes bump their row in data_versions, so caches can
+# tell cheaply whether the data they were built from has changed
+VERSIONED_TABLES = ('attendance', 'students', 'courses', 'settings')
+
+def create_version_triggers(cursor):
+    """Create the data_versions table and the triggers that bump it"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        cursor.execute('INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 0)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            ''')
+
+def create_student_stamps(cursor):
+    """
+    Add students.updated_seq and the triggers that stamp it
+    
+    Every insert or update of a student bumps the 'students' data version and
+    stamps the row with the new value. A process that loaded the students at
+    version V only needs the rows with updated_seq > V to catch up.
+    """
+    cursor.execute("PRAGMA table_info(students)")
+    if 'updated_seq' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE students ADD COLUMN updated_seq INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_updated_seq ON students(updated_seq)')
+    
+    for event, columns in (('INSERT', ''),
+                           ('UPDATE', ' OF student_id, name, email, phone, image_path, face_encoding')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS students_{event.lower()}_stamp
+            AFTER {event}{columns} ON students
+            BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'students';
+                UPDATE students SET updated_seq = (SELECT version FROM data_versions WHERE name = 'students')
+                WHERE id = NEW.id;
+            END
+        ''')
+
+def get_data_versions(tables=VERSIONED_TABLES):
+    """Get the current change counter of each table"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    placeholders = ', '.join('?' for _ in tables)
+    cursor.execute(f'SELECT name, version FROM data_versions WHERE name IN ({placeholders})', tuple(tables))
+    versions = {row['name']: row['version'] for row in cursor.fetchall()}
+    conn.close()
+    return versions
+
+def configure_connection(conn):
+    """Apply the row factory and the configured pragmas to a connection"""
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}')
+    conn.execute(f'PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}')
+    conn.execute(f'PRAGMA synchronous = {SQLITE_SYNCHRONOUS}')
+    conn.execute(f'PRAGMA cache_size = {int(SQLITE_CACHE_SIZE)}')
+    conn.execute(f'PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}')
+    return conn
+
+def connect(database_path=None):
+    """Open a new dedicated connection, e.g. for long-running reads"""
+    conn = sqlite3.connect(database_path or DATABASE_PATH)
+    return configure_connection(conn)
+
 def get_db_connection():
-    """Create and return a database connection"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    """Return this thread's database connection, opening it on first use"""
+    # Inside reporting_connection() the models read from the report's snapshot
+    reader = getattr(_local, 'reader', None)
+    if reader is not None:
+        return reader
+    
+    conn = getattr(_local, 'conn', None)
+    
+    # Reopen after a fork or when the database path changed
+    if conn is not None and (_local.pid != os.getpid() or _local.path != DATABASE_PATH):
+        if _local.pid == os.getpid():
+            conn.close_connection()
+        conn = None
+    
+    if conn is None:
+        conn = _take_idle_connection()
+        if conn is None:
+            # Moved between threads through the pool, but only used by one at a time
+            conn = sqlite3.connect(DATABASE_PATH, factory=PooledConnection, check_same_thread=False)
+            configure_connection(conn)
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.path = DATABASE_PATH
+    
+    return conn
+
+def _take_idle_connection():
+    """An idle pooled connection for this process and database, or None"""
+    with _idle_lock:
+        while _idle_connections:
+            conn, pid, path = _idle_connections.pop()
+            if pid != os.getpid():
+                continue  # Inherited through a fork: leave it to the parent
+            if path == DATABASE_PATH:
+                return conn
+            conn.close_connection()
+    return None
+
+def release_db_connection():
+    """
+    Hand this thread's connection to the shared pool, e.g. at the end of a request
+    
+    With a thread per request (werkzeug's default server) a thread never
+    lives to reuse its own connection, so the next request's thread takes it
+    from the pool instead of connecting and applying the pragmas again.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or conn.transaction_depth > 0:
+        return
+    _local.conn = None
+    if _local.pid != os.getpid():
+        return
+    
+    if conn.in_transaction:
+        conn.rollback()
+    with _idle_lock:
+        if len(_idle_connections) < SQLITE_POOL_SIZE:
+            _idle_connections.append((conn, _local.pid, _local.path))
+            return
+    conn.close_connection()
+
+def close_db_connection():
+    """Close this thread's connection (e.g. on worker shutdown)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        if _local.pid == os.getpid():
+            conn.close_connection()
+        _local.conn = None
+
+@contextmanager
+def transaction(immediate=True):
+    """
+    Run several statements in one transaction on this thread's connection
+    
+    Commits when the block exits normally and rolls back on an exception.
+    Nested blocks join the outermost transaction.
+    
+    Args:
+        immediate: Take the write lock up front (BEGIN IMMEDIATE) so the
+                   transaction cannot fail halfway on a lock upgrade
+    
+    Usage:
+        with transaction() as conn:
+            conn.execute(...)
+            conn.execute(...)
+    """
+    conn = get_db_connection()
+    
+    if conn.transaction_depth > 0:
+        conn.transaction_depth += 1
+        try:
+            yield conn
+        finally:
+            conn.transaction_depth -= 1
+        return
+    
+    if conn.in_transaction:
+        conn.rollback()
+    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    conn.transaction_depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.transaction_depth = 0
+        conn.rollback()
+        raise
+    else:
+        conn.transaction_depth = 0
+        conn.commit()
+
+def configure_reader(conn):
+    """
+    Make a PooledConnection a query-only reporting connection
+    
+    The connection keeps a transaction depth of 1, so the models' commit() and
+    close() calls leave it (and its read transaction) open.
+    """
     conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}')
+    conn.execute(f'PRAGMA cache_size = {int(SQLITE_CACHE_SIZE)}')
+    conn.execute(f'PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}')
+    conn.execute('PRAGMA query_only = ON')
+    conn.transaction_depth = 1
     return conn
 
+def get_reporting_reader():
+    """Return the connection of the active reporting_connection() block on this thread, if any"""
+    return getattr(_local, 'reader', None)
+
+def backup_database(target):
+    """
+    Copy the live database into an open connection with the online backup API
+    
+    The copy runs REPORTING_SNAPSHOT_PAGES pages at a time, so writers are
+    only held up for one step at a time. SQLite restarts the copy if another
+    connection writes mid-way, so the result is always consistent.
+    """
+    source = connect()
+    try:
+        source.backup(target, pages=REPORTING_SNAPSHOT_PAGES, sleep=0.005)
+    finally:
+        source.close()
+
+def snapshot_age(path=None):
+    """Seconds since the snapshot file was refreshed (None if there is none)"""
+    path = path or REPORTING_SNAPSHOT_PATH
+    if not path or not os.path.exists(path):
+        return None
+    return time.time() - os.path.getmtime(path)
+
+def snapshot_is_current(path):
+    """Check whether a snapshot file holds the same data versions as the live database"""
+    if not os.path.exists(path):
+        return False
+    try:
+        snapshot = sqlite3.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+        try:
+            versions = dict(snapshot.execute('SELECT name, version FROM data_versions').fetchall())
+        finally:
+            snapshot.close()
+    except sqlite3.Error:
+        return False
+    return versions == get_data_versions()
+
+def refresh_snapshot(path=None, force=False):
+    """
+    Refresh the read-only reporting snapshot file
+    
+    The copy is written to a temporary file and renamed over the old one, so
+    reports still reading the previous snapshot keep their view. If no table
+    changed since the last copy the file is only marked as fresh.
+    
+    Args:
+        path: Snapshot file (defaults to REPORTING_SNAPSHOT_PATH)
+        force: Copy even if the data is unchanged
+    
+    Returns:
+        bool: True if a new copy was written
+    """
+    path = path or REPORTING_SNAPSHOT_PATH
+    
+    with _snapshot_lock:
+        if not force and snapshot_is_current(path):
+            os.utime(path)
+            return False
+        
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        target = sqlite3.connect(temp_path)
+        try:
+            backup_database(target)
+            # A rollback-journal database opens read-only without a -shm file
+            target.execute('PRAGMA journal_mode = DELETE')
+            target.close()
+            os.replace(temp_path, path)
+        except BaseException:
+            target.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    return True
+
+@contextmanager
+def read_snapshot(database_path=None):
+    """
+    Hold one read transaction on a dedicated query-only connection
+    
+    In WAL mode the block sees the database as of its first read and never
+    blocks writers, so multi-query reports stay consistent while check-ins
+    keep committing.
+    """
+    conn = configure_reader(sqlite3.connect(database_path or DATABASE_PATH, factory=PooledConnection))
+    try:
+        conn.execute('BEGIN')
+        conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchone()
+        yield conn
+    finally:
+        conn.close_connection()
+
+@contextmanager
+def reporting_connection(max_age=None):
+    """
+    Route this thread's model reads to a consistent snapshot for the block
+    
+    REPORTING_SNAPSHOT_PATH selects the snapshot: empty for a WAL read
+    transaction on the live database, ':memory:' for a private in-memory
+    backup, or a file path for a read-only backup file. Nested blocks reuse
+    the outer snapshot.
+    
+    Args:
+        max_age: Oldest snapshot file to accept in seconds before refreshing it
+                 (defaults to REPORTING_SNAPSHOT_MAX_AGE)
+    
+    Usage:
+        with reporting_connection():
+            students = Student.get_all_students()
+            counts = Attendance.get_present_counts()
+    """
+    reader = get_reporting_reader()
+    if reader is not None:
+        yield reader
+        return
+    
+    if not REPORTING_SNAPSHOT_PATH:
+        with read_snapshot() as conn:
+            _local.reader = conn
+            try:
+                yield conn
+            finally:
+                _local.reader = None
+        return
+    
+    if REPORTING_SNAPSHOT_PATH == ':memory:':
+        conn = sqlite3.connect(':memory:', factory=PooledConnection)
+        backup_database(conn)
+    else:
+        if max_age is None:
+            max_age = REPORTING_SNAPSHOT_MAX_AGE
+        age = snapshot_age()
+        if age is None or age > max_age:
+            refresh_snapshot()
+        conn = sqlite3.connect(Path(REPORTING_SNAPSHOT_PATH).resolve().as_uri() + '?mode=ro',
+                               uri=True, factory=PooledConnection)
+    
+    _local.reader = configure_reader(conn)
+    try:
+        yield conn
+    finally:
+        _local.reader = None
+        conn.close_connection()
+
 def init_db():
     """Initialize the database with required tables"""
     conn = get_db_connection()
@@ -62,6 +504,9 @@ def init_db():
         )
     ''')
     
+    create_indexes(cursor)
+    create_attendance_summary(cursor)
+    
     # Create Admin table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS admins (
@@ -82,6 +527,9 @@ def init_db():
         )
     ''')
     
+    create_version_triggers(cursor)
+    create_student_stamps(cursor)
+    
     # Insert default attendance threshold if not exists
     cursor.execute('''
         INSERT OR IGNORE INTO settings (key, value) 
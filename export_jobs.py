@@ -0,0 +1,206 @@
+"""
+Background Export Jobs
+Runs Excel exports on a worker pool and caches finished files by
+export type, parameters and the version of the data they were built from
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config.settings import EXPORT_WORKERS
+from database import get_data_versions, reporting_connection
+from export_utils import export_attendance_to_excel, export_student_attendance_summary
+
+logger = logging.getLogger(__name__)
+
+# Export type -> (export function, tables whose changes invalidate the file)
+EXPORTERS = {
+    'attendance': (export_attendance_to_excel, ('attendance', 'students', 'courses')),
+    'summary': (export_student_attendance_summary, ('attendance', 'students', 'courses', 'settings')),
+}
+
+
+class ExportJob:
+    """State of one export request"""
+    
+    def __init__(self, export_type, params, filename, download_name):
+        self.id = uuid.uuid4().hex
+        self.export_type = export_type
+        self.params = params
+        self.key = filename  # Cache file for the data current at submit time
+        self.filename = filename  # Final file, named after the data actually exported
+        self.download_name = download_name
+        self.status = 'queued'  # queued -> running -> done / empty / failed
+        self.error = None
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at = None
+        self.finished = threading.Event()
+    
+    def finish(self, status, error=None):
+        """Mark the job as finished"""
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self.finished.set()
+    
+    def to_dict(self):
+        """Job status as a JSON-serializable dict"""
+        return {
+            'job_id': self.id,
+            'export_type': self.export_type,
+            'params': self.params,
+            'status': self.status,
+            'cached': self.cached,
+            'error': self.error,
+            'download_name': self.download_name,
+        }
+
+
+class ExportJobManager:
+    """Queue of export jobs served by a thread pool, with file caching"""
+    
+    # Seconds finished jobs stay available for status polling
+    JOB_RETENTION_SECONDS = 3600
+    
+    def __init__(self, max_workers=EXPORT_WORKERS, export_dir='exports'):
+        self.export_dir = export_dir
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export')
+        self.jobs = {}
+        self.active = {}
+        self.lock = threading.Lock()
+    
+    def _artifact_paths(self, export_type, params):
+        """
+        Cache file for the data the models currently read, and the prefix shared
+        by its older versions
+        
+        Files are named <type>_<params hash>_<data version hash>.xlsx, so any
+        process sharing the export folder can reuse a finished file. Inside
+        reporting_connection() the versions come from the report's snapshot.
+        """
+        tables = EXPORTERS[export_type][1]
+        params_hash = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+        version_hash = hashlib.sha1(
+            json.dumps(get_data_versions(tables), sort_keys=True).encode()).hexdigest()[:12]
+        prefix = f"{export_type}_{params_hash}_"
+        return os.path.join(self.export_dir, f"{prefix}{version_hash}.xlsx"), prefix
+    
+    def submit(self, export_type, **params):
+        """
+        Request an export
+        
+        Returns a finished job right away if the file for the current data
+        already exists, the running job if the same export is in progress,
+        or a newly queued job otherwise.
+        """
+        if export_type not in EXPORTERS:
+            raise ValueError(f"Unknown export type: {export_type}")
+        
+        filename, _ = self._artifact_paths(export_type, params)
+        today = datetime.now().strftime('%Y-%m-%d')
+        suffix = params.get('course_code') or 'all'
+        if export_type == 'summary':
+            download_name = f"attendance_summary_{today}.xlsx"
+        else:
+            download_name = f"attendance_{suffix}_{today}.xlsx"
+        
+        with self.lock:
+            self._prune()
+            
+            job = self.active.get(filename)
+            if job is not None:
+                return job
+            
+            job = ExportJob(export_type, params, filename, download_name)
+            self.jobs[job.id] = job
+            
+            if os.path.exists(filename):
+                job.cached = True
+                job.finish('done')
+                return job
+            
+            self.active[filename] = job
+        
+        self.executor.submit(self._run, job)
+        return job
+    
+    def _run(self, job):
+        """Generate the export file for a job"""
+        job.status = 'running'
+        export, _ = EXPORTERS[job.export_type]
+        temp_filename = None
+        
+        try:
+            os.makedirs(self.export_dir, exist_ok=True)
+            # Bring a snapshot file up to date first (a no-op if nothing changed)
+            with reporting_connection(max_age=0):
+                # Name the file after the data this snapshot holds: writes since
+                # submit() make it newer than the job's key
+                job.filename, prefix = self._artifact_paths(job.export_type, job.params)
+                if os.path.exists(job.filename):
+                    job.cached = True
+                    exported = True
+                else:
+                    temp_filename = f"{job.filename}.{job.id}.tmp.xlsx"
+                    exported = export(filename=temp_filename, **job.params)
+            if exported is None:
+                job.finish('empty', 'No data to export')
+            else:
+                if temp_filename is not None:
+                    # Publish atomically so other processes never see a partial file
+                    os.replace(temp_filename, job.filename)
+                    self._remove_stale_artifacts(prefix, job.filename)
+                job.finish('done')
+        except Exception as e:
+            logger.error(f"Export job {job.id} ({job.export_type}) failed: {e}")
+            job.finish('failed', str(e))
+        finally:
+            if temp_filename is not None and os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            with self.lock:
+                self.active.pop(job.key, None)
+    
+    def _remove_stale_artifacts(self, prefix, keep):
+        """
+        Delete files of the same export built from older data, except those
+        of finished jobs still kept for polling (their clients may download them)
+        """
+        with self.lock:
+            self._prune()
+            in_use = {job.filename for job in self.jobs.values() if job.status == 'done'}
+        in_use.add(keep)
+        
+        for name in os.listdir(self.export_dir):
+            path = os.path.join(self.export_dir, name)
+            if name.startswith(prefix) and name.endswith('.xlsx') and path not in in_use and '.tmp.' not in name:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def _prune(self):
+        """Forget finished jobs past their retention time (caller holds the lock)"""
+        cutoff = time.time() - self.JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+    
+    def get(self, job_id):
+        """Get a job by id (None if unknown or expired)"""
+        return self.jobs.get(job_id)
+    
+    def wait(self, job, timeout=None):
+        """Wait for a job to finish; returns True if it did within the timeout"""
+        return job.finished.wait(timeout)
+
+
+# Shared job manager for the web application
+export_jobs = ExportJobManager()
@@ -1,13 +1,113 @@
+import csv
+import io
+import itertools
+import json
 import pandas as pd
 import os
 from datetime import datetime
-from models import Attendance, Student, Course
+from models import Attendance, Student, Course, Settings
+from database import reporting_connection
+
+# Attendance export columns: (header, record field)
+ATTENDANCE_COLUMNS = [
+    ('Student ID', 'student_id'),
+    ('Student Name', 'name'),
+    ('Course Code', 'course_code'),
+    ('Course Name', 'course_name'),
+    ('Date', 'date'),
+    ('Check In', 'check_in_time'),
+    ('Check Out', 'check_out_time'),
+    ('Duration (mins)', 'duration_minutes'),
+    ('Status', 'status'),
+    ('Marked At', 'marked_at'),
+]
+
+def write_xlsx_stream(filename, sheet_name, headers, rows, fills=None, width_sample_rows=1000):
+    """
+    Write rows to an .xlsx file using openpyxl's write-only mode
+    
+    Rows are written to disk as they arrive instead of building the workbook
+    in memory. Write-only sheets need column widths before the first row, so
+    widths are the running maximum over the header and the first
+    width_sample_rows rows, which are held back in a bounded buffer.
+    
+    Args:
+        filename: Output .xlsx path
+        sheet_name: Worksheet title
+        headers: Column headers
+        rows: Iterable of row value sequences (e.g. straight from a DB cursor)
+        fills: Optional iterable parallel to rows giving, per row, a sequence of
+               PatternFill (or None) for each cell
+        width_sample_rows: Number of rows used to size the columns
+        
+    Returns:
+        int: Number of data rows written
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+    
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=sheet_name)
+    
+    rows = iter(rows)
+    fills = iter(fills) if fills is not None else None
+    widths = [len(str(header)) for header in headers]
+    
+    def next_row():
+        row = next(rows)
+        row_fills = next(fills) if fills is not None else None
+        for i, value in enumerate(row):
+            if value is not None:
+                widths[i] = max(widths[i], len(str(value)))
+        if not row_fills:
+            return row
+        cells = []
+        for value, fill in zip(row, row_fills):
+            if fill is None:
+                cells.append(value)
+            else:
+                cell = WriteOnlyCell(worksheet, value=value)
+                cell.fill = fill
+                cells.append(cell)
+        return cells
+    
+    # Size the columns from the header and a bounded sample of rows
+    buffered = []
+    try:
+        while len(buffered) < width_sample_rows:
+            buffered.append(next_row())
+    except StopIteration:
+        pass
+    
+    for i, width in enumerate(widths, start=1):
+        worksheet.column_dimensions[get_column_letter(i)].width = width + 2
+    
+    worksheet.append(list(headers))
+    for row in buffered:
+        worksheet.append(row)
+    count = len(buffered)
+    del buffered
+    
+    while True:
+        try:
+            worksheet.append(next_row())
+        except StopIteration:
+            break
+        count += 1
+    
+    workbook.save(filename)
+    return count
 
 def export_attendance_to_excel(course_code=None, filename=None):
     """
     Export attendance records to Excel
     If course_code is provided, export only that course
     Otherwise, export all attendance records
+    
+    Records are streamed from a reporting snapshot into a write-only workbook,
+    so memory use does not grow with the number of records and the export
+    never holds up check-ins.
     """
     if filename is None:
         today = datetime.now().strftime('%Y-%m-%d')
@@ -16,59 +116,58 @@ def export_attendance_to_excel(course_code=None, filename=None):
         else:
             filename = os.path.join("exports", f"attendance_all_{today}.xlsx")
     
-    # Get attendance records
-    if course_code:
-        records = Attendance.get_attendance_by_course(course_code)
-        course = Course.get_course_by_code(course_code)
-        sheet_name = f"{course_code}"
-    else:
-        records = Attendance.get_all_attendance()
-        sheet_name = "All Attendance"
-    
-    # Convert to list of dictionaries
-    data = []
-    for record in records:
-        data.append({
-            'Student ID': record['student_id'],
-            'Student Name': record['name'] if 'name' in record.keys() else '',
-            'Course Code': record['course_code'],
-            'Course Name': record['course_name'] if 'course_name' in record.keys() else '',
-            'Date': record['date'],
-            'Time': record['time'],
-            'Status': record['status'],
-            'Marked At': record['marked_at']
-        })
-    
-    # Create DataFrame
-    df = pd.DataFrame(data)
+    sheet_name = f"{course_code}" if course_code else "All Attendance"
     
-    if df.empty:
-        print("No attendance records to export")
-        return None
-    
-    # Create Excel writer
-    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
+    with reporting_connection():
+        rows = (
+            [row[field] for _, field in ATTENDANCE_COLUMNS]
+            for chunk in Attendance.iter_attendance_chunks(course_code)
+            for row in chunk
+        )
         
-        # Get the worksheet
-        worksheet = writer.sheets[sheet_name]
+        # Peek at the first record so an empty export writes no file
+        first = next(rows, None)
+        if first is None:
+            print("No attendance records to export")
+            return None
         
-        # Auto-adjust column widths
-        for column in worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
+        write_xlsx_stream(filename, sheet_name, [header for header, _ in ATTENDANCE_COLUMNS],
+                          itertools.chain([first], rows))
     
     print(f"Attendance exported to {filename}")
     return filename
 
+def stream_attendance_csv(course_code=None, chunk_size=1000):
+    """
+    Generate attendance records as CSV text, one chunk of rows at a time
+    
+    Meant for a streaming HTTP response: the header is yielded immediately and
+    memory use does not depend on the number of records.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    writer.writerow([header for header, _ in ATTENDANCE_COLUMNS])
+    yield buffer.getvalue()
+    
+    with reporting_connection():
+        for rows in Attendance.iter_attendance_chunks(course_code, chunk_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([row[field] for _, field in ATTENDANCE_COLUMNS] for row in rows)
+            yield buffer.getvalue()
+
+def stream_attendance_ndjson(course_code=None, chunk_size=1000):
+    """
+    Generate attendance records as newline-delimited JSON, one chunk of rows at a time
+    """
+    with reporting_connection():
+        for rows in Attendance.iter_attendance_chunks(course_code, chunk_size):
+            yield ''.join(
+                json.dumps({field: row[field] for _, field in ATTENDANCE_COLUMNS}) + '\n'
+                for row in rows
+            )
+
 def export_student_attendance_summary(filename=None):
     """
     Export student attendance summary with percentages
@@ -77,69 +176,52 @@ def export_student_attendance_summary(filename=None):
         today = datetime.now().strftime('%Y-%m-%d')
         filename = os.path.join("exports", f"attendance_summary_{today}.xlsx")
     
-    students = Student.get_all_students()
-    courses = Course.get_all_courses()
+    # Read everything from one snapshot so the counts match the student and course lists
+    with reporting_connection():
+        students = Student.get_all_students()
+        courses = Course.get_all_courses()
+        present_counts = Attendance.get_present_counts()
+        threshold = Settings.get_min_attendance_percentage()
     
-    data = []
+    student_ids = [student['student_id'] for student in students]
+    course_codes = [course['course_code'] for course in courses]
     
-    for student in students:
-        student_data = {
-            'Student ID': student['student_id'],
-            'Student Name': student['name'],
-            'Email': student['email']
-        }
-        
-        for course in courses:
-            percentage = Attendance.get_student_attendance_percentage(
-                student['student_id'], 
-                course['course_code']
-            )
-            student_data[f"{course['course_code']} (%)"] = percentage
-        
-        data.append(student_data)
+    # Attended counts for the whole students x courses matrix from one query
+    counts = pd.DataFrame([tuple(row) for row in present_counts],
+                          columns=['student_id', 'course_code', 'attended'])
+    attended = (counts.pivot(index='student_id', columns='course_code', values='attended')
+                .reindex(index=student_ids, columns=course_codes)
+                .fillna(0))
     
-    # Create DataFrame
-    df = pd.DataFrame(data)
+    # Percentage of each course's total classes (0 for courses without classes)
+    totals = pd.Series([course['total_classes'] for course in courses], index=course_codes, dtype=float)
+    percentages = (attended / totals.where(totals > 0) * 100).round(2).fillna(0)
+    percentages.columns = [f"{code} (%)" for code in course_codes]
+    
+    df = pd.DataFrame({
+        'Student ID': student_ids,
+        'Student Name': [student['name'] for student in students],
+        'Email': [student['email'] for student in students]
+    })
+    df = pd.concat([df, percentages.reset_index(drop=True)], axis=1)
     
     if df.empty:
         print("No student data to export")
         return None
     
-    # Create Excel writer
-    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Attendance Summary', index=False)
-        
-        # Get the worksheet
-        worksheet = writer.sheets['Attendance Summary']
-        
-        # Auto-adjust column widths
-        for column in worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-        
-        # Highlight low attendance (below threshold)
-        from openpyxl.styles import PatternFill
-        from models import Settings
-        
-        threshold = Settings.get_min_attendance_percentage()
-        red_fill = PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid')
-        
-        for row in range(2, len(df) + 2):  # Start from row 2 (after header)
-            for col in range(4, len(df.columns) + 1):  # Start from column 4 (after basic info)
-                cell = worksheet.cell(row=row, column=col)
-                try:
-                    if float(cell.value) < threshold:
-                        cell.fill = red_fill
-                except:
-                    pass
+    # Highlight low attendance (below threshold)
+    from openpyxl.styles import PatternFill
+    
+    red_fill = PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid')
+    
+    # Fill map from a vectorized mask: no fill for the 3 basic info columns,
+    # red for percentages below the threshold
+    below_threshold = percentages.to_numpy() < threshold
+    fills = ([None] * 3 + [red_fill if below else None for below in mask_row]
+             for mask_row in below_threshold)
+    
+    write_xlsx_stream(filename, 'Attendance Summary', list(df.columns),
+                      df.itertuples(index=False, name=None), fills=fills)
     
     print(f"Attendance summary exported to {filename}")
     return filename
@@ -1,18 +1,116 @@
 import face_recognition
+import dlib
 import cv2
 import os
+import threading
+import time
 import numpy as np
 from models import Student
+from database import get_data_versions
+from config.settings import GALLERY_CHECK_INTERVAL_MS
 import pickle
 from liveness_detection import LivenessDetector
 
+class GallerySnapshot:
+    """
+    Immutable set of known faces
+    
+    The gallery is replaced as a whole by assigning a new snapshot, so a
+    recognition that took a snapshot always sees IDs and encodings that
+    belong together, without locking.
+    """
+    
+    __slots__ = ('student_ids', 'encodings', 'version')
+    
+    def __init__(self, student_ids, encodings, version):
+        """
+        Args:
+            student_ids: Student IDs, in the order of the encodings
+            encodings: Face encodings (one per student)
+            version: 'students' data version the gallery matches
+        """
+        matrix = np.array(encodings, dtype=np.float64) if len(encodings) else np.empty((0, 128))
+        matrix.flags.writeable = False
+        object.__setattr__(self, 'student_ids', tuple(student_ids))
+        object.__setattr__(self, 'encodings', matrix)
+        object.__setattr__(self, 'version', version)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("GallerySnapshot is immutable")
+    
+    def __len__(self):
+        return len(self.student_ids)
+    
+    def as_dict(self):
+        """Student ID -> encoding, e.g. to build the next snapshot"""
+        return dict(zip(self.student_ids, self.encodings))
+    
+    def match(self, face_encoding, tolerance=0.6):
+        """
+        Find the closest known face
+        
+        Args:
+            face_encoding: Encoding of the face to identify
+            tolerance: Largest distance that counts as a match
+        
+        Returns:
+            tuple: (student_id, confidence) or (None, None) if no match
+        """
+        if not self.student_ids:
+            return None, None
+        
+        # Distances to every known face in one pass
+        face_distances = face_recognition.face_distance(self.encodings, face_encoding)
+        best_match_index = int(np.argmin(face_distances))
+        if face_distances[best_match_index] <= tolerance:
+            return self.student_ids[best_match_index], 1 - face_distances[best_match_index]
+        return None, None
+    
+    def match_many(self, face_encodings, tolerance=0.6):
+        """
+        Find the closest known face for each of several encodings at once
+        
+        Args:
+            face_encodings: Encodings of the faces to identify
+            tolerance: Largest distance that counts as a match
+        
+        Returns:
+            list: (student_id, confidence) or (None, None) per encoding
+        """
+        if not self.student_ids or not len(face_encodings):
+            return [(None, None)] * len(face_encodings)
+        
+        # Faces x known faces distance matrix in one pass
+        probes = np.asarray(face_encodings, dtype=np.float64)
+        face_distances = np.linalg.norm(probes[:, np.newaxis, :] - self.encodings[np.newaxis, :, :], axis=2)
+        best_match_indexes = np.argmin(face_distances, axis=1)
+        
+        results = []
+        for row, best_match_index in enumerate(best_match_indexes):
+            distance = face_distances[row, best_match_index]
+            if distance <= tolerance:
+                results.append((self.student_ids[best_match_index], 1 - distance))
+            else:
+                results.append((None, None))
+        return results
+
+
 class FaceRecognitionSystem:
-    def __init__(self, enable_liveness=True):
-        self.known_face_encodings = []
-        self.known_face_ids = []
+    # Milliseconds between checks for gallery changes made by other processes
+    GALLERY_CHECK_INTERVAL_MS = GALLERY_CHECK_INTERVAL_MS
+    
+    def __init__(self, enable_liveness=True, liveness_roi=True, liveness_overlay=True):
+        self.gallery = GallerySnapshot([], [], None)
+        self.gallery_checked = 0.0
+        self.gallery_lock = threading.Lock()
         self.enable_liveness = enable_liveness
         self.liveness_detector = None
         
+        # Run landmarks only on the target face box instead of the whole frame
+        self.liveness_roi = liveness_roi
+        # Draw eye contours and EAR text (disable for headless kiosks)
+        self.liveness_overlay = liveness_overlay
+        
         # Initialize liveness detector if enabled
         if self.enable_liveness:
             try:
@@ -25,64 +123,107 @@ class FaceRecognitionSystem:
         
         self.load_known_faces()
     
+    def liveness_ready(self):
+        """
+        Check that liveness detection can run, loading its model on first use
+        
+        If the model fails to load (e.g. a corrupt file), liveness detection is
+        turned off for this system instead of failing every frame.
+        """
+        if not (self.enable_liveness and self.liveness_detector):
+            return False
+        if self.liveness_detector.ensure_models():
+            return True
+        
+        print("⚠ Warning: Failed to load the liveness model")
+        print("  Continuing without liveness detection...")
+        self.enable_liveness = False
+        self.liveness_detector = None
+        return False
+    
+    @property
+    def known_face_ids(self):
+        """Student IDs of the current gallery"""
+        return list(self.gallery.student_ids)
+    
+    @property
+    def known_face_encodings(self):
+        """Face encodings of the current gallery"""
+        return list(self.gallery.encodings)
+    
+    @property
+    def gallery_version(self):
+        """'students' data version the current gallery matches"""
+        return self.gallery.version
+    
     def load_known_faces(self):
         """Load all known face encodings from database"""
-        student_ids, encodings = Student.get_all_face_encodings()
-        self.known_face_ids = student_ids
-        self.known_face_encodings = encodings
-        print(f"Loaded {len(self.known_face_encodings)} face encodings")
+        with self.gallery_lock:
+            version, changed, _ = Student.get_face_gallery()
+            self.gallery = GallerySnapshot([student_id for student_id, _ in changed],
+                                           [encoding for _, encoding in changed], version)
+            self.gallery_checked = time.monotonic()
+        print(f"Loaded {len(self.gallery)} face encodings")
     
-    def train_from_image(self, image_path, student_id):
+    def refresh_if_stale(self):
         """
-        Train face recognition from a single image
-        Returns the face encoding or None if no face found
+        Pick up students added, changed or removed by other processes
+        
+        Checks the students data version at most every GALLERY_CHECK_INTERVAL_MS
+        and, if it moved, loads only the students stamped since the gallery was
+        built and drops the ones that no longer exist.
+        
+        Returns:
+            bool: True if the gallery was updated
         """
-        try:
-            # Load image
-            image = face_recognition.load_image_file(image_path)
-            
-            # Find face encodings
-            face_encodings = face_recognition.face_encodings(image)
-            
-            if len(face_encodings) == 0:
-                print(f"No face found in {image_path}")
-                return None
+        now = time.monotonic()
+        if now - self.gallery_checked < self.GALLERY_CHECK_INTERVAL_MS / 1000:
+            return False
+        self.gallery_checked = now
+        
+        if get_data_versions(('students',)).get('students') == self.gallery.version:
+            return False
+        
+        # Writers serialize on the lock; readers keep using the old snapshot
+        with self.gallery_lock:
+            current_gallery = self.gallery
+            version, changed, student_ids = Student.get_face_gallery(since=current_gallery.version)
+            if version == current_gallery.version:
+                return False
             
-            if len(face_encodings) > 1:
-                print(f"Multiple faces found in {image_path}, using the first one")
+            gallery = current_gallery.as_dict()
+            for student_id, encoding in changed:
+                if encoding is None:
+                    gallery.pop(student_id, None)
+                else:
+                    gallery[student_id] = encoding
+            current = set(student_ids)
+            gallery = {student_id: encoding for student_id, encoding in gallery.items() if student_id in current}
             
-            # Return the first face encoding
-            return face_encodings[0]
+            self.gallery = GallerySnapshot(list(gallery), list(gallery.values()), version)
         
-        except Exception as e:
-            print(f"Error processing {image_path}: {str(e)}")
-            return None
+        print(f"Gallery updated: {len(changed)} changed student(s), {len(gallery)} face encodings")
+        return True
+    
+    def train_from_image(self, image_path, student_id):
+        """
+        Train face recognition from a single image
+        Returns the face encoding or None if no face found
+        """
+        return encode_image(image_path)
     
     def train_from_folder(self, folder_path, student_id):
         """
         Train face recognition from multiple images in a folder
         Returns the average face encoding or None if no faces found
         """
-        encodings = []
-        
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                image_path = os.path.join(folder_path, filename)
-                encoding = self.train_from_image(image_path, student_id)
-                
-                if encoding is not None:
-                    encodings.append(encoding)
-        
-        if len(encodings) == 0:
-            return None
-        
-        # Return average encoding for better accuracy
-        return np.mean(encodings, axis=0)
+        return encode_folder(folder_path)
     
     def recognize_face_from_frame(self, frame, tolerance=0.6, check_liveness=True):
         """
         Recognize face from a video frame with optional liveness detection
-        Returns (student_id, confidence, face_location, is_live) or (None, None, None, False) if no match
+        Returns (student_id, confidence, face_location, is_live), (None, None, face_location, False)
+        if a face was found but not matched, or (None, None, None, False) if there is no face
         
         Args:
             frame: Input video frame
@@ -92,10 +233,13 @@ class FaceRecognitionSystem:
         Returns:
             tuple: (student_id, confidence, face_location, is_live)
         """
-        # Perform liveness check if enabled
+        self.refresh_if_stale()
+        
+        # Full-frame liveness check (detects and landmarks every face in view)
         is_live = True
-        if check_liveness and self.enable_liveness and self.liveness_detector:
-            _, blinks, _, frame = self.liveness_detector.detect_blink(frame)
+        run_liveness = check_liveness and self.liveness_ready()
+        if run_liveness and not self.liveness_roi:
+            _, blinks, _, frame = self.liveness_detector.detect_blink(frame, draw=self.liveness_overlay)
             # Require at least 1 blink to be detected over the session
             # The frontend will handle accumulating blinks over multiple frames
             is_live = blinks >= 0  # We'll check blink count in the calling function
@@ -105,40 +249,73 @@ class FaceRecognitionSystem:
         
         # Find faces in frame
         face_locations = face_recognition.face_locations(rgb_frame)
+        
+        # ROI liveness check on the target face only (the largest one in view)
+        if run_liveness and self.liveness_roi and face_locations:
+            target = largest_face(face_locations)
+            self.liveness_detector.detect_blink_in_roi(frame, target, draw=self.liveness_overlay)
+        
         face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
         
         if len(face_encodings) == 0:
             return None, None, None, False
         
-        # Check each face found in frame
+        # Check each face found in frame against one gallery snapshot
+        gallery = self.gallery
         for face_encoding, face_location in zip(face_encodings, face_locations):
-            # Compare with known faces
-            matches = face_recognition.compare_faces(
-                self.known_face_encodings, 
-                face_encoding, 
-                tolerance=tolerance
-            )
-            
-            face_distances = face_recognition.face_distance(
-                self.known_face_encodings, 
-                face_encoding
-            )
-            
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                
-                if matches[best_match_index]:
-                    student_id = self.known_face_ids[best_match_index]
-                    confidence = 1 - face_distances[best_match_index]
-                    return student_id, confidence, face_location, is_live
+            student_id, confidence = gallery.match(face_encoding, tolerance)
+            if student_id is not None:
+                return student_id, confidence, face_location, is_live
+        
+        # Faces in view, none of them known
+        return None, None, face_locations[0], False
+    
+    def recognize_faces_batch(self, frames, tolerance=0.6):
+        """
+        Recognize faces in several video frames (no liveness check)
+        
+        Faces are found frame by frame (HOG detection has no batched form),
+        then the faces of all frames are encoded with one batched call into
+        dlib's face encoder and matched against one gallery snapshot in a
+        single pass.
+        
+        Args:
+            frames: Input video frames (BGR)
+            tolerance: Face matching tolerance (lower = more strict)
+        
+        Returns:
+            list: (student_id, confidence, face_location, is_live) per frame,
+                  as returned by recognize_face_from_frame(check_liveness=False)
+        """
+        self.refresh_if_stale()
+        gallery = self.gallery
+        
+        rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+        locations_per_frame = [face_recognition.face_locations(rgb_frame) for rgb_frame in rgb_frames]
+        encodings_per_frame = batch_face_encodings(rgb_frames, locations_per_frame)
         
-        return None, None, None, False
+        faces = []  # (frame index, face location, face encoding)
+        for index, (face_locations, face_encodings) in enumerate(zip(locations_per_frame, encodings_per_frame)):
+            faces.extend((index, location, encoding) for location, encoding in zip(face_locations, face_encodings))
+        
+        results = [(None, None, None, False)] * len(frames)
+        for index, face_location, _ in reversed(faces):
+            # Unmatched frames report their first face, as in recognize_face_from_frame
+            results[index] = (None, None, face_location, False)
+        matches = gallery.match_many([encoding for _, _, encoding in faces], tolerance)
+        for (index, face_location, _), (student_id, confidence) in zip(faces, matches):
+            # First matching face of each frame, as in recognize_face_from_frame
+            if student_id is not None and results[index][0] is None:
+                results[index] = (student_id, confidence, face_location, True)
+        return results
     
     def recognize_face_from_image(self, image_path, tolerance=0.6):
         """
         Recognize face from an image file
         Returns (student_id, confidence) or (None, None) if no match
         """
+        self.refresh_if_stale()
+        
         try:
             image = face_recognition.load_image_file(image_path)
             face_encodings = face_recognition.face_encodings(image)
@@ -146,29 +323,8 @@ class FaceRecognitionSystem:
             if len(face_encodings) == 0:
                 return None, None
             
-            face_encoding = face_encodings[0]
-            
             # Compare with known faces
-            matches = face_recognition.compare_faces(
-                self.known_face_encodings, 
-                face_encoding, 
-                tolerance=tolerance
-            )
-            
-            face_distances = face_recognition.face_distance(
-                self.known_face_encodings, 
-                face_encoding
-            )
-            
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                
-                if matches[best_match_index]:
-                    student_id = self.known_face_ids[best_match_index]
-                    confidence = 1 - face_distances[best_match_index]
-                    return student_id, confidence
-            
-            return None, None
+            return self.gallery.match(face_encodings[0], tolerance)
         
         except Exception as e:
             print(f"Error recognizing face: {str(e)}")
@@ -193,23 +349,122 @@ class FaceRecognitionSystem:
         
         return frame
 
+def batch_face_encodings(images, locations_per_image):
+    """
+    Encode the faces of several images with one call into dlib's face encoder
+    
+    Gives the same encodings as face_recognition.face_encodings() image by
+    image, but lets dlib run the network over the whole batch at once.
+    
+    Args:
+        images: RGB images
+        locations_per_image: Face locations found in each image
+    
+    Returns:
+        list: Face encodings per image, in the order of its face locations
+    """
+    try:
+        # face_recognition internals (as of 1.3.0, pinned in requirements.txt)
+        from face_recognition.api import _raw_face_landmarks, face_encoder
+    except (ImportError, AttributeError):
+        # Other versions: encode image by image through the public API
+        return [face_recognition.face_encodings(image, face_locations) if face_locations else []
+                for image, face_locations in zip(images, locations_per_image)]
+    
+    batch_images, batch_faces, owners = [], [], []
+    for index, (image, face_locations) in enumerate(zip(images, locations_per_image)):
+        if not face_locations:
+            continue
+        landmarks = dlib.full_object_detections()
+        for shape in _raw_face_landmarks(image, face_locations, model='small'):
+            landmarks.append(shape)
+        batch_images.append(image)
+        batch_faces.append(landmarks)
+        owners.append(index)
+    
+    encodings = [[] for _ in images]
+    if batch_images:
+        descriptors = face_encoder.compute_face_descriptor(batch_images, batch_faces, 1)
+        for index, image_descriptors in zip(owners, descriptors):
+            encodings[index] = [np.array(descriptor) for descriptor in image_descriptors]
+    return encodings
+
+def largest_face(face_locations):
+    """The (top, right, bottom, left) box with the largest area, i.e. the person nearest the camera"""
+    return max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+
+# Encoding needs no gallery or liveness model, so these are plain functions
+# that can also run in worker processes (see scripts/bulk_enroll.py)
+
+def encode_image(image_path):
+    """
+    Encode the face in a single image
+    Returns the face encoding or None if no face found
+    """
+    try:
+        # Load image
+        image = face_recognition.load_image_file(image_path)
+        
+        # Find face encodings
+        face_encodings = face_recognition.face_encodings(image)
+        
+        if len(face_encodings) == 0:
+            print(f"No face found in {image_path}")
+            return None
+        
+        if len(face_encodings) > 1:
+            print(f"Multiple faces found in {image_path}, using the first one")
+        
+        # Return the first face encoding
+        return face_encodings[0]
+    
+    except Exception as e:
+        print(f"Error processing {image_path}: {str(e)}")
+        return None
+
+def encode_folder(folder_path):
+    """
+    Encode the faces in every image of a folder
+    Returns the average face encoding or None if no faces found
+    """
+    encodings = []
+    
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            encoding = encode_image(os.path.join(folder_path, filename))
+            
+            if encoding is not None:
+                encodings.append(encoding)
+    
+    if len(encodings) == 0:
+        return None
+    
+    # Return average encoding for better accuracy
+    return np.mean(encodings, axis=0)
+
+def encode_student_images(image_path):
+    """
+    Encode a student's face from a single image or a folder of images
+    Returns the face encoding or None if no face found or the path is invalid
+    """
+    if os.path.isfile(image_path):
+        return encode_image(image_path)
+    if os.path.isdir(image_path):
+        return encode_folder(image_path)
+    print(f"Invalid path: {image_path}")
+    return None
+
 def process_student_images(student_id, name, email, phone, image_path):
     """
     Process student images and add to database
     image_path can be a single image or folder
     """
-    fr_system = FaceRecognitionSystem()
-    
-    if os.path.isfile(image_path):
-        # Single image
-        encoding = fr_system.train_from_image(image_path, student_id)
-    elif os.path.isdir(image_path):
-        # Folder of images
-        encoding = fr_system.train_from_folder(image_path, student_id)
-    else:
+    if not os.path.exists(image_path):
         print(f"Invalid path: {image_path}")
         return False
     
+    encoding = encode_student_images(image_path)
+    
     if encoding is None:
         print("Failed to process images - no face detected")
         return False
@@ -0,0 +1,162 @@
+"""
+Inference Executor
+Runs face recognition on a fixed pool of worker threads with a bounded
+queue, so a burst of requests waits in line (or is turned away) instead of
+oversubscribing the CPU with parallel dlib work
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(Exception):
+    """Raised when every worker is busy and the queue is full"""
+    
+    def __init__(self, retry_after):
+        super().__init__(f"Inference queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for recognition work
+    
+    At most workers calls run at once and at most queue_size more wait for a
+    worker; further calls fail fast with ExecutorSaturated. The time a call
+    spent waiting for a worker and the time it spent running are tracked
+    separately.
+    
+    Usage:
+        executor = InferenceExecutor()
+        try:
+            result = executor.run(fr_system.recognize_face_from_frame, frame)
+        except ExecutorSaturated as e:
+            ...  # Answer 429 with Retry-After: e.retry_after
+    """
+    
+    # Recent calls kept for the latency percentiles
+    SAMPLE_SIZE = 500
+    
+    def __init__(self, workers=INFERENCE_WORKERS, queue_size=INFERENCE_QUEUE_SIZE):
+        """
+        Args:
+            workers: Calls running at once (about one per CPU core)
+            queue_size: Calls allowed to wait for a worker
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.running = 0
+        self.queue_waits = deque(maxlen=self.SAMPLE_SIZE)
+        self.service_times = deque(maxlen=self.SAMPLE_SIZE)
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+    
+    def retry_after(self):
+        """Seconds a rejected caller should wait before retrying (at least 1)"""
+        with self.lock:
+            service = sum(self.service_times) / len(self.service_times) if self.service_times else 1.0
+            backlog = self.in_flight
+        # Time for the workers to work through everything admitted so far
+        return max(1, math.ceil(service * backlog / self.workers))
+    
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue a call
+        
+        Returns:
+            Future: Resolves to the call's result
+        
+        Raises:
+            ExecutorSaturated: If the workers are busy and the queue is full
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.stats['rejected'] += 1
+            retry_after = self.retry_after()
+            logger.warning(f"Inference rejected: {self.workers} running, {self.queue_size} queued")
+            raise ExecutorSaturated(retry_after)
+        
+        with self.lock:
+            self.in_flight += 1
+            self.stats['submitted'] += 1
+        
+        try:
+            future = self.executor.submit(self._call, time.monotonic(), fn, args, kwargs)
+        except Exception:
+            self._release()
+            raise
+        # Free the slot however the call ends (including cancellation)
+        future.add_done_callback(lambda _: self._release())
+        return future
+    
+    def run(self, fn, *args, **kwargs):
+        """Queue a call and wait for its result (see submit)"""
+        return self.submit(fn, *args, **kwargs).result()
+    
+    def _call(self, queued_at, fn, args, kwargs):
+        """Worker side of a call: run it and record its timings"""
+        started = time.monotonic()
+        with self.lock:
+            self.running += 1
+            self.queue_waits.append(started - queued_at)
+        
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            finished = time.monotonic()
+            with self.lock:
+                self.running -= 1
+                self.service_times.append(finished - started)
+                self.stats['failed' if failed else 'completed'] += 1
+    
+    def _release(self):
+        """Give back a call's admission slot"""
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+    
+    @staticmethod
+    def _percentiles(samples):
+        """p50/p95/max of a list of durations, in milliseconds"""
+        if not samples:
+            return {'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+        ordered = sorted(samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+        return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'max_ms': round(ordered[-1] * 1000, 1)}
+    
+    def get_stats(self):
+        """Current load, call counts and queue-wait/service latencies"""
+        with self.lock:
+            queue_waits = list(self.queue_waits)
+            service_times = list(self.service_times)
+            stats = dict(self.stats)
+            running = self.running
+            in_flight = self.in_flight
+        
+        stats.update({
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'running': running,
+            'queued': in_flight - running,
+            'queue_wait': self._percentiles(queue_waits),
+            'service': self._percentiles(service_times),
+        })
+        return stats
+    
+    def shutdown(self, wait=True):
+        """Stop the workers after the calls already admitted"""
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,389 @@
+"""
+Inference Server
+Optional face recognition service on a Unix domain socket. The server owns
+the dlib models and the face gallery; web workers send it frames through
+InferenceClient instead of loading the models and recognizing themselves.
+
+The listening socket is bound once and then shared by several forked worker
+processes (about one per core). Each worker takes the frames that queued up
+while it was busy as one micro-batch: faces are detected frame by frame,
+encoded with one batched call into dlib's face encoder and matched against
+the gallery in one pass. A batch doesn't wait for more frames unless
+INFERENCE_BATCH_WAIT_MS is set.
+
+Usage:
+    python inference_server.py [--socket /tmp/face_inference.sock] [--workers 4]
+    INFERENCE_SOCKET=/tmp/face_inference.sock python app.py
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from config.settings import (INFERENCE_SOCKET, INFERENCE_SERVER_WORKERS, INFERENCE_BATCH_SIZE,
+                             INFERENCE_BATCH_WAIT_MS, INFERENCE_CLIENT_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '/tmp/face_inference.sock'
+
+# Message framing: header length, payload length, JSON header, raw payload
+_FRAME = struct.Struct('!II')
+
+
+def send_message(sock, header, payload=b''):
+    """Send a JSON header and an optional binary payload"""
+    header_bytes = json.dumps(header).encode()
+    sock.sendall(_FRAME.pack(len(header_bytes), len(payload)) + header_bytes)
+    if payload:
+        sock.sendall(payload)
+
+
+def _recv_exactly(sock, size):
+    """Read exactly size bytes (None if the peer closed the connection first)"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            return None
+        received += count
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    """
+    Receive one message
+    
+    Returns:
+        tuple: (header, payload), or (None, None) if the connection closed
+    """
+    lengths = _recv_exactly(sock, _FRAME.size)
+    if lengths is None:
+        return None, None
+    header_length, payload_length = _FRAME.unpack(lengths)
+    header_bytes = _recv_exactly(sock, header_length)
+    payload = _recv_exactly(sock, payload_length) if payload_length else b''
+    if header_bytes is None or payload is None:
+        return None, None
+    return json.loads(header_bytes), payload
+
+
+class InferenceUnavailable(Exception):
+    """Raised when the inference server cannot be reached or fails a request"""
+
+
+class InferenceClient:
+    """
+    Client for the inference server
+    
+    Offers recognize_face_from_frame() like FaceRecognitionSystem (without
+    liveness detection, which stays with the video feed). Each thread keeps
+    its own connection to the server.
+    """
+    
+    def __init__(self, socket_path=INFERENCE_SOCKET or DEFAULT_SOCKET, timeout=INFERENCE_CLIENT_TIMEOUT):
+        """
+        Args:
+            socket_path: Unix socket of the inference server
+            timeout: Seconds to wait for a reply
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+    
+    def _connection(self):
+        """This thread's connection, opened on first use"""
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+    
+    def _close(self):
+        """Drop this thread's connection"""
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+    
+    def request(self, header, payload=b''):
+        """
+        Send a request and wait for the reply
+        
+        Retries once on a fresh connection if the request could not be sent,
+        e.g. after the server restarted. Once it was sent it is never sent
+        again: after a timeout the server may still be working on it.
+        
+        Raises:
+            InferenceUnavailable: If the server can't be reached or reports an error
+        """
+        for attempt in (1, 2):
+            sent = False
+            try:
+                sock = self._connection()
+                send_message(sock, header, payload)
+                sent = True
+                reply, _ = recv_message(sock)
+                if reply is None:
+                    raise ConnectionError("Inference server closed the connection")
+                break
+            except OSError as e:
+                self._close()
+                if sent or attempt == 2:
+                    raise InferenceUnavailable(f"Inference server unavailable: {e}") from e
+        
+        if reply.get('error'):
+            raise InferenceUnavailable(reply['error'])
+        return reply
+    
+    def recognize_face_from_frame(self, frame, tolerance=0.6, check_liveness=False):
+        """
+        Recognize a face in a video frame on the inference server
+        
+        Returns:
+            tuple: (student_id, confidence, face_location, is_live) as returned by
+                   FaceRecognitionSystem.recognize_face_from_frame(check_liveness=False)
+        """
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        reply = self.request({'op': 'recognize', 'shape': frame.shape, 'tolerance': tolerance},
+                             frame.tobytes())
+        face_location = tuple(reply['face_location']) if reply['face_location'] else None
+        return reply['student_id'], reply['confidence'], face_location, reply['is_live']
+    
+    def get_stats(self):
+        """Batching statistics of the worker serving this connection"""
+        return self.request({'op': 'stats'})
+
+
+class _Request:
+    """A frame waiting for its batch"""
+    
+    def __init__(self, frame, tolerance):
+        self.frame = frame
+        self.tolerance = tolerance
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class InferenceWorker:
+    """
+    One server process: accepts connections on the shared listening socket
+    and recognizes the frames they send in micro-batches
+    """
+    
+    def __init__(self, listener, batch_size=INFERENCE_BATCH_SIZE, batch_wait_ms=INFERENCE_BATCH_WAIT_MS):
+        """
+        Args:
+            listener: Bound, listening Unix socket (shared with the other workers)
+            batch_size: Most frames recognized together
+            batch_wait_ms: Longest a frame waits for more frames to join its batch
+                           (0: batch only the frames already queued)
+        """
+        self.listener = listener
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'batches': 0, 'errors': 0, 'largest_batch': 0, 'busy_seconds': 0.0}
+        self.fr_system = None
+    
+    def serve_forever(self):
+        """Load the gallery, start the batcher and accept connections"""
+        # Imported here so the parent loads the dlib models once before forking
+        from face_recognition_module import FaceRecognitionSystem
+        self.fr_system = FaceRecognitionSystem(enable_liveness=False)
+        
+        threading.Thread(target=self._batch_loop, name='inference-batcher', daemon=True).start()
+        while True:
+            conn, _ = self.listener.accept()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+    
+    def _handle(self, conn):
+        """Serve one client connection until it closes"""
+        with conn:
+            while True:
+                try:
+                    header, payload = recv_message(conn)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Dropping inference connection: {e}")
+                    return
+                if header is None:
+                    return
+                
+                if header.get('op') == 'stats':
+                    with self.lock:
+                        reply = dict(self.stats, pid=os.getpid(), gallery_size=len(self.fr_system.gallery))
+                elif header.get('op') == 'recognize':
+                    reply = self._recognize(header, payload)
+                else:
+                    reply = {'error': f"Unknown operation: {header.get('op')}"}
+                
+                try:
+                    send_message(conn, reply)
+                except OSError:
+                    return
+    
+    def _recognize(self, header, payload):
+        """Queue a frame for the next batch and wait for its result"""
+        try:
+            frame = np.frombuffer(payload, dtype=np.uint8).reshape(header['shape'])
+        except (KeyError, TypeError, ValueError) as e:
+            return {'error': f"Invalid frame: {e}"}
+        
+        request = _Request(frame, float(header.get('tolerance', 0.6)))
+        self.requests.put(request)
+        request.done.wait()
+        if request.error:
+            return {'error': request.error}
+        
+        student_id, confidence, face_location, is_live = request.result
+        return {
+            'student_id': student_id,
+            'confidence': float(confidence) if confidence is not None else None,
+            'face_location': [int(value) for value in face_location] if face_location else None,
+            'is_live': bool(is_live),
+        }
+    
+    def _batch_loop(self):
+        """Gather queued frames into batches and recognize them"""
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    # Frames that queued up while the last batch ran join right away
+                    batch.append(self.requests.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            # Frames with another tolerance are matched in their own group
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.tolerance, []).append(request)
+            
+            started = time.monotonic()
+            for tolerance, requests in groups.items():
+                try:
+                    results = self.fr_system.recognize_faces_batch(
+                        [request.frame for request in requests], tolerance=tolerance)
+                    for request, result in zip(requests, results):
+                        request.result = result
+                except Exception as e:
+                    logger.error(f"Inference batch of {len(requests)} frame(s) failed: {e}")
+                    for request in requests:
+                        request.error = str(e)
+                for request in requests:
+                    request.done.set()
+            
+            with self.lock:
+                self.stats['requests'] += len(batch)
+                self.stats['batches'] += 1
+                self.stats['errors'] += sum(1 for request in batch if request.error)
+                self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+                self.stats['busy_seconds'] += time.monotonic() - started
+
+
+def _worker_main(listener, batch_size, batch_wait_ms):
+    """Entry point of a forked worker process"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent handles Ctrl+C
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        InferenceWorker(listener, batch_size, batch_wait_ms).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(socket_path=DEFAULT_SOCKET, workers=INFERENCE_SERVER_WORKERS, batch_size=INFERENCE_BATCH_SIZE,
+          batch_wait_ms=INFERENCE_BATCH_WAIT_MS):
+    """
+    Bind the socket, fork the workers and keep them running until stopped
+    
+    Args:
+        socket_path: Unix socket to listen on
+        workers: Worker processes (each runs one batch at a time)
+        batch_size: Most frames recognized together
+        batch_wait_ms: Longest a frame waits for more frames to join its batch
+    """
+    # Load dlib's models once; the forked workers share them copy-on-write
+    import face_recognition  # noqa: F401
+    
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o660)
+    listener.listen(128)
+    
+    context = multiprocessing.get_context('fork')
+    processes = []
+    
+    def start_worker():
+        process = context.Process(target=_worker_main, args=(listener, batch_size, batch_wait_ms),
+                                  name='inference-worker', daemon=True)
+        process.start()
+        return process
+    
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    
+    print(f"Inference server listening on {socket_path} with {workers} worker(s)")
+    try:
+        processes = [start_worker() for _ in range(workers)]
+        while not stopping.wait(1.0):
+            # Replace workers that died
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.warning(f"Inference worker {process.pid} exited ({process.exitcode}), restarting")
+                    processes[index] = start_worker()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(5)
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print("Inference server stopped")
+
+
+def main():
+    """Run the inference server"""
+    parser = argparse.ArgumentParser(description="Face recognition inference server")
+    parser.add_argument('--socket', default=INFERENCE_SOCKET or DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument('--workers', type=int, default=INFERENCE_SERVER_WORKERS, help="Worker processes")
+    parser.add_argument('--batch-size', type=int, default=INFERENCE_BATCH_SIZE, help="Most frames per batch")
+    parser.add_argument('--batch-wait-ms', type=float, default=INFERENCE_BATCH_WAIT_MS,
+                        help="Longest a frame waits for its batch to fill")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    serve(args.socket, args.workers, args.batch_size, args.batch_wait_ms)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,90 @@ Liveness Detection Module
 Implements blink detection to prevent photo/picture spoofing attacks
 """
 
+import logging
+import os
+import threading
+import time
+
 import cv2
 import dlib
 import numpy as np
-from scipy.spatial import distance as dist
 from imutils import face_utils
 
+logger = logging.getLogger(__name__)
+
+SHAPE_PREDICTOR_PATH = "shape_predictor_68_face_landmarks.dat"
+
+# Detector/predictor pairs shared by every LivenessDetector in the process, keyed by model path
+_shared_models = {}
+_shared_models_lock = threading.Lock()
+
+
+def load_liveness_models(model_path=SHAPE_PREDICTOR_PATH):
+    """
+    Load dlib's face detector and landmark predictor once per process
+    
+    Args:
+        model_path: Path to the 68-point shape predictor model
+        
+    Returns:
+        tuple: (detector, predictor)
+    """
+    with _shared_models_lock:
+        models = _shared_models.get(model_path)
+        if models is None:
+            start = time.perf_counter()
+            models = (dlib.get_frontal_face_detector(), dlib.shape_predictor(model_path))
+            _shared_models[model_path] = models
+            logger.info(f"Loaded liveness models from {model_path} "
+                        f"in {time.perf_counter() - start:.2f}s")
+        return models
+
+
+class EARBuffer:
+    """Fixed-size ring buffer of timestamped Eye Aspect Ratio samples"""
+    
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+        self.head = 0
+    
+    def clear(self):
+        """Drop all samples"""
+        self.size = 0
+        self.head = 0
+    
+    def append(self, ear, timestamp):
+        """Store a sample, overwriting the oldest one when the buffer is full"""
+        self.values[self.head] = ear
+        self.timestamps[self.head] = timestamp
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def _order(self):
+        """Indexes of the stored samples from oldest to newest"""
+        return (self.head - self.size + np.arange(self.size)) % self.capacity
+    
+    def series(self):
+        """
+        Get the buffered samples in chronological order
+        
+        Returns:
+            tuple: (values, timestamps) as NumPy arrays, oldest first
+        """
+        order = self._order()
+        return self.values[order], self.timestamps[order]
+    
+    def smoothed(self, window):
+        """Moving average of the last `window` samples (the latest raw value if window <= 1)"""
+        if self.size == 0:
+            return 0.0
+        window = max(1, min(window, self.size))
+        last = (self.head - 1 - np.arange(window)) % self.capacity
+        return float(self.values[last].mean())
+
 class LivenessDetector:
     """Detects if a face is from a live person by detecting blinks"""
     
@@ -18,12 +96,37 @@ class LivenessDetector:
     # Number of consecutive frames the eye must be below threshold to count as a blink
     EAR_CONSEC_FRAMES = 2
     
-    def __init__(self):
-        """Initialize the liveness detector with dlib's face detector and predictor"""
+    # Minimum eye-closed duration in seconds to count as a blink. When set, this
+    # replaces EAR_CONSEC_FRAMES so the check no longer depends on the frame rate
+    EAR_MIN_CLOSED_SECONDS = None
+    
+    # Number of recent samples averaged before comparing against the threshold
+    EAR_SMOOTHING_WINDOW = 1
+    
+    # Number of EAR samples kept in the ring buffer
+    EAR_BUFFER_SIZE = 64
+    
+    # Margin added around a face box before cropping, as a fraction of the box size
+    ROI_MARGIN = 0.25
+    
+    # Landmark indexes of the six points of each eye in the 68-point model
+    EYE_LANDMARKS = np.array([
+        np.arange(*face_utils.FACIAL_LANDMARKS_IDXS["left_eye"]),
+        np.arange(*face_utils.FACIAL_LANDMARKS_IDXS["right_eye"]),
+    ])
+    
+    def __init__(self, model_path=SHAPE_PREDICTOR_PATH):
+        """
+        Initialize the liveness detector
+        
+        dlib's face detector and landmark predictor are loaded lazily on first
+        use and shared across detectors in the process (see load_liveness_models).
+        """
         try:
-            # Initialize dlib's face detector and facial landmark predictor
-            self.detector = dlib.get_frontal_face_detector()
-            self.predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
+            # Fail early if the model is missing, but defer loading it
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"{model_path} not found")
+            self.model_path = model_path
             
             # Grab the indexes of the facial landmarks for the left and right eye
             (self.lStart, self.lEnd) = face_utils.FACIAL_LANDMARKS_IDXS["left_eye"]
@@ -34,11 +137,43 @@ class LivenessDetector:
             self.frame_counter = 0
             self.total_blinks = 0
             
+            # Timestamped EAR history used for blink detection
+            self.ear_buffer = EARBuffer(self.EAR_BUFFER_SIZE)
+            self.eye_closed = False
+            
         except Exception as e:
             raise Exception(f"Failed to initialize liveness detector: {str(e)}\n"
                           f"Make sure 'shape_predictor_68_face_landmarks.dat' is in the project directory.")
     
-    def calculate_ear(self, eye):
+    def ensure_models(self):
+        """
+        Load the models if they aren't loaded yet
+        
+        A truncated or corrupt model file only fails here, on first use, since
+        the constructor just checks that the file exists.
+        
+        Returns:
+            bool: True if the models are available
+        """
+        try:
+            load_liveness_models(self.model_path)
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to load liveness model {self.model_path}: {e}")
+            return False
+    
+    @property
+    def detector(self):
+        """dlib frontal face detector, loaded on first use"""
+        return load_liveness_models(self.model_path)[0]
+    
+    @property
+    def predictor(self):
+        """dlib 68-point landmark predictor, loaded on first use"""
+        return load_liveness_models(self.model_path)[1]
+    
+    @staticmethod
+    def calculate_ear(eye):
         """
         Calculate the Eye Aspect Ratio (EAR)
         
@@ -47,37 +182,135 @@ class LivenessDetector:
         - When eyes close: EAR rapidly decreases
         
         Args:
-            eye: Array of (x, y) coordinates for the eye landmarks
+            eye: Array of (x, y) coordinates for the eye landmarks, shape (..., 6, 2)
             
         Returns:
-            float: The Eye Aspect Ratio
+            float or numpy.ndarray: The Eye Aspect Ratio for each eye
         """
-        # Compute the euclidean distances between the two sets of
-        # vertical eye landmarks (x, y)-coordinates
-        A = dist.euclidean(eye[1], eye[5])
-        B = dist.euclidean(eye[2], eye[4])
+        eye = np.asarray(eye, dtype=np.float64)
         
-        # Compute the euclidean distance between the horizontal
-        # eye landmark (x, y)-coordinates
-        C = dist.euclidean(eye[0], eye[3])
+        # Pairs of landmarks: the two vertical distances (1-5, 2-4) and the
+        # horizontal distance (0-3), all computed in one call
+        diffs = eye[..., [1, 2, 0], :] - eye[..., [5, 4, 3], :]
+        A, B, C = np.moveaxis(np.sqrt((diffs ** 2).sum(axis=-1)), -1, 0)
         
         # Compute the eye aspect ratio
-        ear = (A + B) / (2.0 * C)
+        return (A + B) / (2.0 * C)
+    
+    def calculate_eyes_ear(self, shape):
+        """
+        Calculate the average EAR of both eyes from a full landmark array
         
-        return ear
+        Args:
+            shape: (68, 2) array of facial landmark coordinates
+            
+        Returns:
+            tuple: (ear, eyes) - mean EAR of both eyes and the (2, 6, 2) eye coordinates
+        """
+        eyes = shape[self.EYE_LANDMARKS]
+        return float(self.calculate_ear(eyes).mean()), eyes
+    
+    def _closed_duration(self):
+        """
+        Length of the closed-eye run that just ended, in frames and seconds
+        
+        The latest sample is the first one with the eye open again, so the run
+        is made of the below-threshold samples right before it.
+        """
+        values, timestamps = self.ear_buffer.series()
+        below = values[:-1] < self.EAR_THRESHOLD
+        if self.EAR_SMOOTHING_WINDOW > 1:
+            kernel = np.ones(self.EAR_SMOOTHING_WINDOW) / self.EAR_SMOOTHING_WINDOW
+            padded = np.concatenate([np.full(self.EAR_SMOOTHING_WINDOW - 1, values[0]), values])
+            below = np.convolve(padded, kernel, mode='valid')[:-1] < self.EAR_THRESHOLD
+        
+        open_idx = np.flatnonzero(~below)
+        start = open_idx[-1] + 1 if open_idx.size else 0
+        frames = below.size - start
+        if frames == 0:
+            return 0, 0.0
+        return frames, float(timestamps[-1] - timestamps[start])
+    
+    def update_ear(self, ear, timestamp=None):
+        """
+        Add an EAR sample and run blink detection over the buffered series
+        
+        Args:
+            ear: Eye Aspect Ratio of the current frame
+            timestamp: Capture time in seconds (defaults to the monotonic clock)
+            
+        Returns:
+            bool: True if a blink ended on this sample
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.ear_buffer.append(ear, timestamp)
+        
+        if self.ear_buffer.smoothed(self.EAR_SMOOTHING_WINDOW) < self.EAR_THRESHOLD:
+            self.eye_closed = True
+            self.frame_counter += 1
+            return False
+        
+        blink_detected = False
+        if self.eye_closed:
+            # If the eyes were closed long enough then count a blink
+            frames, seconds = self._closed_duration()
+            if self.EAR_MIN_CLOSED_SECONDS is not None:
+                blink_detected = bool(seconds >= self.EAR_MIN_CLOSED_SECONDS)
+            else:
+                blink_detected = bool(frames >= self.EAR_CONSEC_FRAMES)
+            if blink_detected:
+                self.total_blinks += 1
+        
+        # Reset the eye frame counter
+        self.eye_closed = False
+        self.frame_counter = 0
+        return blink_detected
     
     def reset_blink_counter(self):
         """Reset the blink counters"""
         self.blink_counter = 0
         self.frame_counter = 0
         self.total_blinks = 0
+        self.ear_buffer.clear()
+        self.eye_closed = False
     
-    def detect_blink(self, frame):
+    def _process_shape(self, frame, shape, timestamp, draw):
+        """
+        Update blink state from one face's landmarks and optionally draw the overlay
+        
+        Returns:
+            tuple: (blink_detected, ear_value)
+        """
+        # Compute the eye aspect ratio for both eyes at once
+        ear, (leftEye, rightEye) = self.calculate_eyes_ear(shape)
+        
+        # Record the sample and check whether a blink just ended
+        blink_detected = self.update_ear(ear, timestamp)
+        
+        if draw:
+            # Visualize the eye regions
+            leftEyeHull = cv2.convexHull(leftEye)
+            rightEyeHull = cv2.convexHull(rightEye)
+            cv2.drawContours(frame, [leftEyeHull], -1, (0, 255, 0), 1)
+            cv2.drawContours(frame, [rightEyeHull], -1, (0, 255, 0), 1)
+            
+            # Draw the total number of blinks and EAR on the frame
+            cv2.putText(frame, f"Blinks: {self.total_blinks}", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.putText(frame, f"EAR: {ear:.2f}", (10, 60),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        
+        return blink_detected, ear
+    
+    def detect_blink(self, frame, timestamp=None, draw=True):
         """
         Detect if a blink occurred in the given frame
         
         Args:
             frame: Input video frame (BGR format from OpenCV)
+            timestamp: Capture time in seconds (defaults to the monotonic clock)
+            draw: Draw eye contours and EAR text on the frame (False for headless use)
             
         Returns:
             tuple: (blink_detected, total_blinks, ear_value, frame_with_overlay)
@@ -101,41 +334,49 @@ class LivenessDetector:
             shape = self.predictor(gray, face)
             shape = face_utils.shape_to_np(shape)
             
-            # Extract the left and right eye coordinates
-            leftEye = shape[self.lStart:self.lEnd]
-            rightEye = shape[self.rStart:self.rEnd]
-            
-            # Compute the eye aspect ratio for both eyes
-            leftEAR = self.calculate_ear(leftEye)
-            rightEAR = self.calculate_ear(rightEye)
-            
-            # Average the eye aspect ratio for both eyes
-            ear = (leftEAR + rightEAR) / 2.0
-            
-            # Visualize the eye regions
-            leftEyeHull = cv2.convexHull(leftEye)
-            rightEyeHull = cv2.convexHull(rightEye)
-            cv2.drawContours(frame, [leftEyeHull], -1, (0, 255, 0), 1)
-            cv2.drawContours(frame, [rightEyeHull], -1, (0, 255, 0), 1)
-            
-            # Check if the eye aspect ratio is below the blink threshold
-            if ear < self.EAR_THRESHOLD:
-                self.frame_counter += 1
-            else:
-                # If the eyes were closed for a sufficient number of frames
-                # then increment the total number of blinks
-                if self.frame_counter >= self.EAR_CONSEC_FRAMES:
-                    self.total_blinks += 1
-                    blink_detected = True
-                
-                # Reset the eye frame counter
-                self.frame_counter = 0
+            face_blink, ear = self._process_shape(frame, shape, timestamp, draw)
+            if face_blink:
+                blink_detected = True
+        
+        return blink_detected, self.total_blinks, ear, frame
+    
+    def detect_blink_in_roi(self, frame, face_location, timestamp=None, draw=True):
+        """
+        Detect a blink on a single known face, skipping full-frame face detection
+        
+        Only the face box (plus ROI_MARGIN) is cropped and converted to grayscale,
+        and only the landmark predictor runs on it, so the cost does not depend on
+        the frame resolution or on how many other people are in view.
+        
+        Args:
+            frame: Input video frame (BGR format from OpenCV)
+            face_location: (top, right, bottom, left) box from face recognition or tracking
+            timestamp: Capture time in seconds (defaults to the monotonic clock)
+            draw: Draw eye contours and EAR text on the frame (False for headless use)
             
-            # Draw the total number of blinks and EAR on the frame
-            cv2.putText(frame, f"Blinks: {self.total_blinks}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(frame, f"EAR: {ear:.2f}", (10, 60),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        Returns:
+            tuple: (blink_detected, total_blinks, ear_value, frame_with_overlay)
+        """
+        top, right, bottom, left = face_location
+        height, width = frame.shape[:2]
+        
+        # Crop the face box with a margin, clamped to the frame
+        margin = int(self.ROI_MARGIN * max(bottom - top, right - left))
+        x0, y0 = max(0, left - margin), max(0, top - margin)
+        x1, y1 = min(width, right + margin), min(height, bottom + margin)
+        if x1 <= x0 or y1 <= y0:
+            return False, self.total_blinks, 0.0, frame
+        
+        gray = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        
+        # Run the predictor on the face box expressed in crop coordinates
+        face = dlib.rectangle(int(left - x0), int(top - y0), int(right - x0), int(bottom - y0))
+        shape = face_utils.shape_to_np(self.predictor(gray, face))
+        
+        # Move the landmarks back to frame coordinates for drawing
+        shape += (x0, y0)
+        
+        blink_detected, ear = self._process_shape(frame, shape, timestamp, draw)
         
         return blink_detected, self.total_blinks, ear, frame
     
@@ -5,7 +5,8 @@ to the new check-in/check-out system with duration tracking.
 """
 
 import sqlite3
-from database import DATABASE_PATH, get_db_connection
+from database import (DATABASE_PATH, get_db_connection, create_indexes, ATTENDANCE_INDEXES,
+                      create_attendance_summary, create_version_triggers, create_student_stamps)
 
 def migrate_database():
     """Migrate database to new schema"""
@@ -96,6 +97,80 @@ def migrate_database():
     finally:
         conn.close()
 
+def migrate_indexes():
+    """Add the attendance reporting indexes to an existing database"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name, _ in ATTENDANCE_INDEXES if name not in existing]
+        
+        if not missing:
+            print("Reporting indexes already present!")
+            return
+        
+        print(f"Creating {len(missing)} reporting index(es)...")
+        create_indexes(cursor)
+        
+        # Refresh planner statistics so the new indexes get picked up
+        cursor.execute('ANALYZE')
+        conn.commit()
+        print("Reporting indexes created successfully!")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\nIndex migration failed: {str(e)}")
+        raise
+    
+    finally:
+        conn.close()
+
+def migrate_attendance_summary():
+    """Add the attendance_summary table to an existing database, filled from its history"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance_summary'")
+        if cursor.fetchone():
+            print("Attendance summary table already present!")
+            return
+        
+        print("Creating attendance summary table...")
+        create_attendance_summary(cursor)
+        conn.commit()
+        print("Attendance summary table created successfully!")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\nAttendance summary migration failed: {str(e)}")
+        raise
+    
+    finally:
+        conn.close()
+
+def migrate_student_stamps():
+    """Add the students change stamp used to refresh face galleries incrementally"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        print("Adding student change stamps...")
+        create_version_triggers(cursor)
+        create_student_stamps(cursor)
+        conn.commit()
+        print("Student change stamps added successfully!")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\nStudent stamp migration failed: {str(e)}")
+        raise
+    
+    finally:
+        conn.close()
+
 def check_migration_status():
     """Check if migration is needed"""
     conn = get_db_connection()
@@ -115,11 +190,17 @@ if __name__ == '__main__':
     
     if status == "already_migrated":
         print("Database is already up to date!")
+        migrate_indexes()
+        migrate_attendance_summary()
+        migrate_student_stamps()
     else:
         print("Database migration required...")
         response = input("Do you want to proceed with migration? (yes/no): ")
         
         if response.lower() in ['yes', 'y']:
             migrate_database()
+            migrate_indexes()
+            migrate_attendance_summary()
+            migrate_student_stamps()
         else:
             print("Migration cancelled.")
@@ -1,29 +1,67 @@
 import sqlite3
-from database import get_db_connection
+from database import get_db_connection, transaction, connect, get_reporting_reader, get_data_versions
+from config.settings import DEFAULT_MIN_ATTENDANCE_PERCENTAGE
 import pickle
+import threading
+import time
 from datetime import datetime, date
 
+# Cached dashboard statistics, see Dashboard.get_stats
+_dashboard_cache = {'stats': None, 'expires': 0.0, 'generation': 0}
+_dashboard_lock = threading.Lock()
+
+# All rows of the settings table and the data version they were read at, see Settings
+_settings_cache = {'values': None, 'version': None, 'checked': 0.0}
+_settings_lock = threading.Lock()
+
+# Today's attendance records, see TodayAttendance
+_today_index = {'day': None, 'records': {}}
+_today_lock = threading.Lock()
+
 class Student:
     @staticmethod
     def add_student(student_id, name, email, phone, image_path, face_encoding):
         """Add a new student to the database"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Serialize face encoding
         encoding_blob = pickle.dumps(face_encoding) if face_encoding is not None else None
         
         try:
-            cursor.execute('''
-                INSERT INTO students (student_id, name, email, phone, image_path, face_encoding)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (student_id, name, email, phone, image_path, encoding_blob))
-            conn.commit()
-            conn.close()
-            return True
+            with transaction() as conn:
+                conn.execute('''
+                    INSERT INTO students (student_id, name, email, phone, image_path, face_encoding)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (student_id, name, email, phone, image_path, encoding_blob))
         except sqlite3.IntegrityError:
-            conn.close()
             return False
+        Dashboard.invalidate()
+        return True
+    
+    @staticmethod
+    def add_students_batch(students):
+        """
+        Add many students in one transaction
+        
+        Args:
+            students: List of (student_id, name, email, phone, image_path, face_encoding)
+        
+        Returns:
+            list: IDs of the students added (students whose ID already exists are skipped)
+        """
+        added = []
+        with transaction() as conn:
+            cursor = conn.cursor()
+            for student_id, name, email, phone, image_path, face_encoding in students:
+                encoding_blob = pickle.dumps(face_encoding) if face_encoding is not None else None
+                cursor.execute('''
+                    INSERT OR IGNORE INTO students (student_id, name, email, phone, image_path, face_encoding)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (student_id, name, email, phone, image_path, encoding_blob))
+                if cursor.rowcount:
+                    added.append(student_id)
+        
+        if added:
+            Dashboard.invalidate()
+        return added
     
     @staticmethod
     def get_all_students():
@@ -48,24 +86,30 @@ class Student:
     @staticmethod
     def update_student(student_id, name, email, phone):
         """Update student information"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE students 
-            SET name = ?, email = ?, phone = ?
-            WHERE student_id = ?
-        ''', (name, email, phone, student_id))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE students 
+                SET name = ?, email = ?, phone = ?
+                WHERE student_id = ?
+            ''', (name, email, phone, student_id))
+        Dashboard.invalidate()
     
     @staticmethod
     def delete_student(student_id):
         """Delete a student"""
+        with transaction() as conn:
+            conn.execute('DELETE FROM students WHERE student_id = ?', (student_id,))
+        Dashboard.invalidate()
+    
+    @staticmethod
+    def count_students():
+        """Get the number of students"""
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM students WHERE student_id = ?', (student_id,))
-        conn.commit()
+        cursor.execute('SELECT COUNT(*) AS total FROM students')
+        total = cursor.fetchone()['total']
         conn.close()
+        return total
     
     @staticmethod
     def get_all_face_encodings():
@@ -83,25 +127,57 @@ class Student:
             encodings.append(pickle.loads(row['face_encoding']))
         
         return student_ids, encodings
+    
+    @staticmethod
+    def get_face_gallery(since=None):
+        """
+        Get face encodings together with the students data version they match
+        
+        Args:
+            since: Only return students stamped after this version (None for all)
+        
+        Returns:
+            tuple: (version, changed, student_ids) - the 'students' data version,
+                   a list of (student_id, encoding) pairs (encoding is None for a
+                   student without one), and, when since is given, the IDs of all
+                   current students so removed ones can be dropped
+        """
+        # One read transaction, so the rows match the version
+        with transaction(immediate=False) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM data_versions WHERE name = 'students'")
+            version = cursor.fetchone()['version']
+            
+            student_ids = None
+            if since is None:
+                cursor.execute('SELECT student_id, face_encoding FROM students WHERE face_encoding IS NOT NULL')
+                rows = cursor.fetchall()
+            else:
+                cursor.execute('''
+                    SELECT student_id, face_encoding FROM students WHERE updated_seq > ?
+                ''', (since,))
+                rows = cursor.fetchall()
+                cursor.execute('SELECT student_id FROM students')
+                student_ids = [row['student_id'] for row in cursor.fetchall()]
+        
+        changed = [(row['student_id'], pickle.loads(row['face_encoding']) if row['face_encoding'] else None)
+                   for row in rows]
+        return version, changed, student_ids
 
 class Course:
     @staticmethod
     def add_course(course_code, course_name, instructor, schedule, total_classes=30, class_duration_minutes=60, min_duration_minutes=45):
         """Add a new course"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT INTO courses (course_code, course_name, instructor, schedule, total_classes, class_duration_minutes, min_duration_minutes)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (course_code, course_name, instructor, schedule, total_classes, class_duration_minutes, min_duration_minutes))
-            conn.commit()
-            conn.close()
-            return True
+            with transaction() as conn:
+                conn.execute('''
+                    INSERT INTO courses (course_code, course_name, instructor, schedule, total_classes, class_duration_minutes, min_duration_minutes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (course_code, course_name, instructor, schedule, total_classes, class_duration_minutes, min_duration_minutes))
         except sqlite3.IntegrityError:
-            conn.close()
             return False
+        Dashboard.invalidate()
+        return True
     
     @staticmethod
     def get_all_courses():
@@ -126,114 +202,316 @@ class Course:
     @staticmethod
     def update_course(course_code, course_name, instructor, schedule, total_classes=30, class_duration_minutes=60, min_duration_minutes=45):
         """Update course information"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE courses 
-            SET course_name = ?, instructor = ?, schedule = ?, total_classes = ?, class_duration_minutes = ?, min_duration_minutes = ?
-            WHERE course_code = ?
-        ''', (course_name, instructor, schedule, total_classes, class_duration_minutes, min_duration_minutes, course_code))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE courses 
+                SET course_name = ?, instructor = ?, schedule = ?, total_classes = ?, class_duration_minutes = ?, min_duration_minutes = ?
+                WHERE course_code = ?
+            ''', (course_name, instructor, schedule, total_classes, class_duration_minutes, min_duration_minutes, course_code))
+        Dashboard.invalidate()
     
     @staticmethod
     def delete_course(course_code):
         """Delete a course"""
+        with transaction() as conn:
+            conn.execute('DELETE FROM courses WHERE course_code = ?', (course_code,))
+        Dashboard.invalidate()
+    
+    @staticmethod
+    def count_courses():
+        """Get the number of courses"""
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM courses WHERE course_code = ?', (course_code,))
-        conn.commit()
+        cursor.execute('SELECT COUNT(*) AS total FROM courses')
+        total = cursor.fetchone()['total']
         conn.close()
+        return total
 
 class Attendance:
     @staticmethod
     def check_in(student_id, course_code):
         """Check in a student for attendance"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Already checked in today: answered from memory without a query
+        if TodayAttendance.get(student_id, course_code) is not None:
+            return False
         
         today = date.today().isoformat()
         current_time = datetime.now().strftime('%H:%M:%S')
         
         try:
-            cursor.execute('''
-                INSERT INTO attendance (student_id, course_code, date, check_in_time, status)
-                VALUES (?, ?, ?, ?, 'Checked In')
-            ''', (student_id, course_code, today, current_time))
-            conn.commit()
-            conn.close()
-            return True
+            with transaction() as conn:
+                conn.execute('''
+                    INSERT INTO attendance (student_id, course_code, date, check_in_time, status)
+                    VALUES (?, ?, ?, ?, 'Checked In')
+                ''', (student_id, course_code, today, current_time))
         except sqlite3.IntegrityError:
-            # Already checked in for today
-            conn.close()
+            # Already checked in for today (by another process)
+            TodayAttendance.reload(student_id, course_code)
             return False
+        
+        TodayAttendance.set(student_id, course_code, today, {
+            'check_in_time': current_time, 'check_out_time': None,
+            'duration_minutes': None, 'status': 'Checked In'
+        })
+        Dashboard.invalidate()
+        return True
     
     @staticmethod
     def check_out(student_id, course_code):
         """Check out a student and calculate attendance status"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         today = date.today().isoformat()
         current_time = datetime.now()
         
-        # Get attendance record for today
-        cursor.execute('''
-            SELECT * FROM attendance
-            WHERE student_id = ? AND course_code = ? AND date = ?
-        ''', (student_id, course_code, today))
-        record = cursor.fetchone()
+        # Already checked out today: answered from memory without a query
+        known = TodayAttendance.get(student_id, course_code)
+        if known is not None and known['check_out_time']:
+            return False, "Already checked out"
         
-        if not record:
-            conn.close()
-            return False, "No check-in record found for today"
+        with transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Get attendance record for today
+            cursor.execute('''
+                SELECT * FROM attendance
+                WHERE student_id = ? AND course_code = ? AND date = ?
+            ''', (student_id, course_code, today))
+            record = cursor.fetchone()
+            
+            if not record:
+                return False, "No check-in record found for today"
+            
+            if record['check_out_time']:
+                TodayAttendance.set(student_id, course_code, today, dict(record))
+                return False, "Already checked out"
+            
+            # Get course minimum duration
+            cursor.execute('SELECT min_duration_minutes FROM courses WHERE course_code = ?', (course_code,))
+            course = cursor.fetchone()
+            min_duration = course['min_duration_minutes'] if course else 45
+            
+            # Calculate duration and status
+            duration_minutes, status = Attendance._attendance_status(
+                today, record['check_in_time'], current_time, min_duration)
+            
+            # Update record
+            cursor.execute('''
+                UPDATE attendance
+                SET check_out_time = ?, duration_minutes = ?, status = ?
+                WHERE student_id = ? AND course_code = ? AND date = ?
+            ''', (current_time.strftime('%H:%M:%S'), duration_minutes, status, student_id, course_code, today))
+            
+            Attendance._update_summary(cursor, [(student_id, course_code, today, status)])
         
-        if record['check_out_time']:
-            conn.close()
-            return False, "Already checked out"
+        TodayAttendance.set(student_id, course_code, today, dict(
+            record, check_out_time=current_time.strftime('%H:%M:%S'),
+            duration_minutes=duration_minutes, status=status))
+        Dashboard.invalidate()
+        return True, status
+    
+    @staticmethod
+    def _update_summary(cursor, finished):
+        """
+        Count finished attendance records in attendance_summary
         
-        # Get course minimum duration
-        cursor.execute('SELECT min_duration_minutes FROM courses WHERE course_code = ?', (course_code,))
-        course = cursor.fetchone()
-        min_duration = course['min_duration_minutes'] if course else 45
+        Runs on the cursor of the transaction that records the check-outs, so
+        the summary can never disagree with the attendance table.
         
-        # Calculate duration
-        check_in_time = datetime.strptime(record['check_in_time'], '%H:%M:%S')
-        current_date = date.today()
-        check_in_datetime = datetime.combine(current_date, check_in_time.time())
-        duration_minutes = int((current_time - check_in_datetime).total_seconds() / 60)
+        Args:
+            cursor: Cursor of the writing transaction
+            finished: (student_id, course_code, date, status) tuples
+        """
+        cursor.executemany('''
+            INSERT INTO attendance_summary (student_id, course_code, attended, left_early, last_seen)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(student_id, course_code) DO UPDATE SET
+                attended = attended + excluded.attended,
+                left_early = left_early + excluded.left_early,
+                last_seen = MAX(COALESCE(last_seen, excluded.last_seen), excluded.last_seen)
+        ''', [(student_id, course_code, int(status == 'Present'), int(status == 'Absent (Left Early)'), day)
+              for student_id, course_code, day, status in finished])
+    
+    @staticmethod
+    def _attendance_status(day, check_in_time, check_out_at, min_duration):
+        """
+        Work out the duration and final status of an attendance record
+        
+        Args:
+            day: Attendance date (ISO format)
+            check_in_time: Check-in time ('HH:MM:SS')
+            check_out_at: Check-out datetime
+            min_duration: Minutes needed to count as present
+        
+        Returns:
+            tuple: (duration_minutes, status)
+        """
+        check_in_datetime = datetime.combine(date.fromisoformat(day),
+                                             datetime.strptime(check_in_time, '%H:%M:%S').time())
+        duration_minutes = int((check_out_at - check_in_datetime).total_seconds() / 60)
         
-        # Determine status
         if duration_minutes >= min_duration:
             status = 'Present'
         else:
             status = 'Absent (Left Early)'
         
-        # Update record
-        cursor.execute('''
-            UPDATE attendance
-            SET check_out_time = ?, duration_minutes = ?, status = ?
-            WHERE student_id = ? AND course_code = ? AND date = ?
-        ''', (current_time.strftime('%H:%M:%S'), duration_minutes, status, student_id, course_code, today))
+        return duration_minutes, status
+    
+    @staticmethod
+    def apply_action(record, action, timestamp, min_duration):
+        """
+        Decide the outcome of one check-in or check-out against a day's record
         
-        conn.commit()
-        conn.close()
-        return True, status
+        Args:
+            record: dict with check_in_time, check_out_time and status, or None
+            action: 'check_in' or 'check_out'
+            timestamp: When the action happened (datetime)
+            min_duration: The course's minimum minutes to count as present
+        
+        Returns:
+            tuple: (outcome, record, change) - a dict with success, outcome,
+                   status and message; the record after the action (None if
+                   there still is none); and the values to write, (check_in_time,)
+                   or (check_out_time, duration_minutes, status), or None
+        """
+        if action == 'check_in':
+            if record is None:
+                record = {'check_in_time': timestamp.strftime('%H:%M:%S'), 'check_out_time': None,
+                          'duration_minutes': None, 'status': 'Checked In'}
+                return ({'success': True, 'outcome': 'checked_in', 'status': record['status'],
+                         'message': 'Checked in successfully'},
+                        record, (record['check_in_time'],))
+            if record['check_out_time']:
+                return ({'success': False, 'outcome': 'already_checked_out', 'status': record['status'],
+                         'message': 'Already checked out for today'}, record, None)
+            return ({'success': False, 'outcome': 'already_checked_in', 'status': record['status'],
+                     'message': 'Already checked in'}, record, None)
+        
+        if action == 'check_out':
+            if record is None:
+                return ({'success': False, 'outcome': 'not_checked_in', 'status': None,
+                         'message': 'No check-in record found for today'}, None, None)
+            if record['check_out_time']:
+                return ({'success': False, 'outcome': 'already_checked_out', 'status': record['status'],
+                         'message': 'Already checked out'}, record, None)
+            
+            duration_minutes, status = Attendance._attendance_status(
+                timestamp.date().isoformat(), record['check_in_time'], timestamp, min_duration)
+            record = dict(record, check_out_time=timestamp.strftime('%H:%M:%S'),
+                          duration_minutes=duration_minutes, status=status)
+            return ({'success': True, 'outcome': 'checked_out', 'status': status,
+                     'message': f'Checked out successfully! Status: {status}'},
+                    record, (record['check_out_time'], duration_minutes, status))
+        
+        return ({'success': False, 'outcome': 'invalid_action', 'status': None,
+                 'message': f'Unknown action: {action}'}, record, None)
     
     @staticmethod
-    def get_today_status(student_id, course_code):
-        """Get today's attendance status for a student"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        today = date.today().isoformat()
+    def batch_attendance(entries):
+        """
+        Check in and check out many students in a single transaction
         
-        cursor.execute('''
-            SELECT * FROM attendance
-            WHERE student_id = ? AND course_code = ? AND date = ?
-        ''', (student_id, course_code, today))
-        record = cursor.fetchone()
-        conn.close()
-        return record
+        Existing records are read up front, outcomes are decided in memory and
+        the changes are written with two executemany calls, so a whole batch
+        costs one commit. Entries are applied in order, so a check-in followed
+        by a check-out for the same student behaves as it would one at a time.
+        
+        Args:
+            entries: Iterable of (student_id, course_code, action) or
+                     (student_id, course_code, action, timestamp) tuples, where
+                     action is 'check_in' or 'check_out' and timestamp is an
+                     optional datetime (defaults to now; timezone-aware values
+                     are converted to naive local time like the stored records)
+        
+        Returns:
+            list: One dict per entry with student_id, course_code, action, success,
+                  outcome ('checked_in', 'already_checked_in', 'checked_out',
+                  'already_checked_out', 'not_checked_in' or 'invalid_action'),
+                  status and message
+        """
+        now = datetime.now()
+        entries = [(entry[0], entry[1], entry[2],
+                    entry[3] if len(entry) > 3 and entry[3] is not None else now)
+                   for entry in entries]
+        entries = [(student_id, course_code, action,
+                    timestamp.astimezone().replace(tzinfo=None) if timestamp.tzinfo else timestamp)
+                   for student_id, course_code, action, timestamp in entries]
+        if not entries:
+            return []
+        
+        students_by_day = {}
+        for student_id, _, _, timestamp in entries:
+            students_by_day.setdefault(timestamp.date().isoformat(), set()).add(student_id)
+        course_codes = list({course_code for _, course_code, _, _ in entries})
+        
+        results = []
+        check_ins = []
+        check_outs = []
+        
+        with transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Existing records of the students in the batch, one query per day
+            records = {}
+            for day, student_ids in students_by_day.items():
+                student_ids = list(student_ids)
+                for start in range(0, len(student_ids), 500):
+                    chunk = student_ids[start:start + 500]
+                    cursor.execute(f'''
+                        SELECT student_id, course_code, date, check_in_time, check_out_time,
+                               duration_minutes, status
+                        FROM attendance
+                        WHERE date = ? AND student_id IN ({', '.join('?' * len(chunk))})
+                    ''', [day] + chunk)
+                    for row in cursor.fetchall():
+                        records[(row['student_id'], row['course_code'], row['date'])] = dict(row)
+            
+            cursor.execute(f'''
+                SELECT course_code, min_duration_minutes FROM courses
+                WHERE course_code IN ({', '.join('?' * len(course_codes))})
+            ''', course_codes)
+            min_durations = {row['course_code']: row['min_duration_minutes'] for row in cursor.fetchall()}
+            
+            for student_id, course_code, action, timestamp in entries:
+                day = timestamp.date().isoformat()
+                key = (student_id, course_code, day)
+                outcome, records[key], change = Attendance.apply_action(
+                    records.get(key), action, timestamp, min_durations.get(course_code, 45))
+                
+                if change is not None and action == 'check_in':
+                    check_ins.append((student_id, course_code, day) + change)
+                elif change is not None:
+                    check_outs.append(change + (student_id, course_code, day))
+                
+                results.append({'student_id': student_id, 'course_code': course_code,
+                                'action': action, **outcome})
+            
+            cursor.executemany('''
+                INSERT INTO attendance (student_id, course_code, date, check_in_time, status)
+                VALUES (?, ?, ?, ?, 'Checked In')
+                ON CONFLICT(student_id, course_code, date) DO NOTHING
+            ''', check_ins)
+            cursor.executemany('''
+                UPDATE attendance
+                SET check_out_time = ?, duration_minutes = ?, status = ?
+                WHERE student_id = ? AND course_code = ? AND date = ? AND check_out_time IS NULL
+            ''', check_outs)
+            Attendance._update_summary(cursor, [
+                (student_id, course_code, day, status)
+                for _, _, status, student_id, course_code, day in check_outs
+            ])
+        
+        # The records now match the database, so they can answer later lookups
+        for (student_id, course_code, day), record in records.items():
+            if record is not None:
+                TodayAttendance.set(student_id, course_code, day, record)
+        
+        if check_ins or check_outs:
+            Dashboard.invalidate()
+        return results
+    
+    @staticmethod
+    def get_today_status(student_id, course_code):
+        """Get today's attendance record for a student (None if not checked in)"""
+        return TodayAttendance.get(student_id, course_code)
     
     @staticmethod
     def mark_attendance(student_id, course_code, status='Present'):
@@ -289,11 +567,12 @@ class Attendance:
         
         # Get attended classes
         cursor.execute('''
-            SELECT COUNT(*) as attended
-            FROM attendance
-            WHERE student_id = ? AND course_code = ? AND status = 'Present'
+            SELECT attended
+            FROM attendance_summary
+            WHERE student_id = ? AND course_code = ?
         ''', (student_id, course_code))
-        attended = cursor.fetchone()['attended']
+        summary = cursor.fetchone()
+        attended = summary['attended'] if summary else 0
         
         conn.close()
         
@@ -302,6 +581,102 @@ class Attendance:
         
         return round((attended / total) * 100, 2)
     
+    @staticmethod
+    def get_attendance_percentages(student_id=None, course_code=None):
+        """
+        Calculate attendance percentages in bulk from attendance_summary
+        
+        Pass student_id for one student across all courses, or course_code
+        for all students in one course.
+        
+        Returns:
+            dict: course_code (or student_id) -> percentage, ordered by key
+        """
+        if (student_id is None) == (course_code is None):
+            raise ValueError("Pass exactly one of student_id or course_code")
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        if student_id is not None:
+            cursor.execute('''
+                SELECT c.course_code AS key, c.total_classes AS total, COALESCE(a.attended, 0) AS attended
+                FROM courses c
+                LEFT JOIN attendance_summary a
+                    ON a.student_id = ? AND a.course_code = c.course_code
+                ORDER BY c.course_code
+            ''', (student_id,))
+        else:
+            cursor.execute('''
+                SELECT s.student_id AS key, c.total_classes AS total, COALESCE(a.attended, 0) AS attended
+                FROM students s
+                JOIN courses c ON c.course_code = ?
+                LEFT JOIN attendance_summary a
+                    ON a.student_id = s.student_id AND a.course_code = c.course_code
+                ORDER BY s.student_id
+            ''', (course_code,))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {
+            row['key']: round((row['attended'] / row['total']) * 100, 2) if row['total'] else 0
+            for row in rows
+        }
+    
+    @staticmethod
+    def get_present_counts():
+        """
+        Get the number of 'Present' records for every (student, course) pair that has any
+        (read from attendance_summary)
+        
+        Returns:
+            list: rows of (student_id, course_code, attended)
+        """
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT student_id, course_code, attended
+            FROM attendance_summary
+            WHERE attended > 0
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    @staticmethod
+    def iter_attendance_chunks(course_code=None, chunk_size=1000):
+        """
+        Stream attendance records (newest first) in chunks of at most chunk_size rows
+        
+        Uses its own connection (or the snapshot of an active reporting_connection()
+        block) and fetchmany, so memory stays constant no matter how many rows
+        match and other queries on this thread are unaffected.
+        
+        Yields:
+            list: the next chunk of rows
+        """
+        where = 'WHERE a.course_code = ?' if course_code else ''
+        params = (course_code,) if course_code else ()
+        
+        conn = get_reporting_reader() or connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT a.*, s.name, c.course_name 
+                FROM attendance a
+                JOIN students s ON a.student_id = s.student_id
+                JOIN courses c ON a.course_code = c.course_code
+                {where}
+                ORDER BY a.date DESC, a.check_in_time DESC
+            ''', params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+    
     @staticmethod
     def get_all_attendance():
         """Get all attendance records"""
@@ -318,29 +693,313 @@ class Attendance:
         conn.close()
         return records
 
-class Settings:
     @staticmethod
-    def get_min_attendance_percentage():
-        """Get minimum attendance percentage threshold"""
+    def get_attendance_page(student_id=None, course_code=None, status=None,
+                            date_from=None, date_to=None, after=None, limit=50):
+        """
+        Get one page of attendance records, newest first, using keyset pagination
+        
+        Rows are ordered by (date, check_in_time, id) and each page starts right
+        after the key of the previous page's last row, so deep pages cost the
+        same as the first one. All filters are applied in SQL.
+        
+        Args:
+            student_id, course_code, status: Optional equality filters
+            date_from, date_to: Optional inclusive ISO date range
+            after: (date, check_in_time, id) key of the last row already shown
+            limit: Maximum number of rows to return
+            
+        Returns:
+            tuple: (records, next_key) - next_key is None on the last page
+        """
+        conditions = []
+        params = []
+        for column, value in (('a.student_id', student_id), ('a.course_code', course_code),
+                              ('a.status', status)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if date_from:
+            conditions.append('a.date >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append('a.date <= ?')
+            params.append(date_to)
+        if after:
+            conditions.append('(a.date, a.check_in_time, a.id) < (?, ?, ?)')
+            params.extend(after)
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT value FROM settings WHERE key = ?', ('min_attendance_percentage',))
-        result = cursor.fetchone()
+        cursor.execute(f'''
+            SELECT a.*, s.name, c.course_name 
+            FROM attendance a
+            JOIN students s ON a.student_id = s.student_id
+            JOIN courses c ON a.course_code = c.course_code
+            {where}
+            ORDER BY a.date DESC, a.check_in_time DESC, a.id DESC
+            LIMIT ?
+        ''', params + [limit + 1])
+        records = cursor.fetchall()
         conn.close()
-        return int(result['value']) if result else 75
+        
+        # One extra row tells whether another page exists
+        next_key = None
+        if len(records) > limit:
+            records = records[:limit]
+            last = records[-1]
+            next_key = (last['date'], last['check_in_time'], last['id'])
+        
+        return records, next_key
     
     @staticmethod
-    def set_min_attendance_percentage(percentage):
-        """Set minimum attendance percentage threshold"""
+    def count_attendance():
+        """Get the number of attendance records"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) AS total FROM attendance')
+        total = cursor.fetchone()['total']
+        conn.close()
+        return total
+    
+    @staticmethod
+    def get_recent_attendance(limit=10):
+        """Get the most recent attendance records"""
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            UPDATE settings 
-            SET value = ?
-            WHERE key = ?
-        ''', (str(percentage), 'min_attendance_percentage'))
-        conn.commit()
+            SELECT a.*, s.name, c.course_name 
+            FROM attendance a
+            JOIN students s ON a.student_id = s.student_id
+            JOIN courses c ON a.course_code = c.course_code
+            ORDER BY a.date DESC, a.check_in_time DESC
+            LIMIT ?
+        ''', (limit,))
+        records = cursor.fetchall()
+        conn.close()
+        return records
+    
+    @staticmethod
+    def get_today_counts_by_course():
+        """Get today's checked in / present / left early counts for every course"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        today = date.today().isoformat()
+        cursor.execute('''
+            SELECT c.course_code, c.course_name,
+                   COUNT(a.id) AS total,
+                   COALESCE(SUM(a.status = 'Checked In'), 0) AS checked_in,
+                   COALESCE(SUM(a.status = 'Present'), 0) AS present,
+                   COALESCE(SUM(a.status = 'Absent (Left Early)'), 0) AS left_early
+            FROM courses c
+            LEFT JOIN attendance a ON a.course_code = c.course_code AND a.date = ?
+            GROUP BY c.course_code
+            ORDER BY c.course_code
+        ''', (today,))
+        counts = cursor.fetchall()
+        conn.close()
+        return counts
+
+class TodayAttendance:
+    """
+    In-memory index of today's attendance records by (student_id, course_code)
+    
+    Loaded from today's rows on first use and again after midnight, then kept
+    up to date by every attendance write in this process, so duplicate
+    check-ins and status lookups are answered without a query.
+    """
+    
+    @staticmethod
+    def _load(day):
+        """Read a day's records from the database"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT student_id, course_code, check_in_time, check_out_time, duration_minutes, status
+            FROM attendance
+            WHERE date = ?
+        ''', (day,))
+        records = {
+            (row['student_id'], row['course_code']): {
+                'check_in_time': row['check_in_time'], 'check_out_time': row['check_out_time'],
+                'duration_minutes': row['duration_minutes'], 'status': row['status']
+            }
+            for row in cursor.fetchall()
+        }
         conn.close()
+        return records
+    
+    @staticmethod
+    def _records():
+        """Today's records, reloading them when the day changed (caller holds the lock)"""
+        today = date.today().isoformat()
+        if _today_index['day'] != today:
+            _today_index['records'] = TodayAttendance._load(today)
+            _today_index['day'] = today
+        return _today_index['records']
+    
+    @staticmethod
+    def warm():
+        """Load today's records now (e.g. at startup)"""
+        with _today_lock:
+            _today_index['day'] = None
+            TodayAttendance._records()
+    
+    @staticmethod
+    def get(student_id, course_code):
+        """Get a copy of today's record for a student and course, or None"""
+        with _today_lock:
+            record = TodayAttendance._records().get((student_id, course_code))
+        return dict(record) if record is not None else None
+    
+    @staticmethod
+    def set(student_id, course_code, day, record):
+        """Store a record that was just written (ignored if it is not for today)"""
+        with _today_lock:
+            records = TodayAttendance._records()
+            if day == _today_index['day']:
+                records[(student_id, course_code)] = {
+                    key: record.get(key) for key in
+                    ('check_in_time', 'check_out_time', 'duration_minutes', 'status')
+                }
+    
+    @staticmethod
+    def reload(student_id, course_code):
+        """Re-read one record that another process may have written"""
+        today = date.today().isoformat()
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT check_in_time, check_out_time, duration_minutes, status
+            FROM attendance
+            WHERE student_id = ? AND course_code = ? AND date = ?
+        ''', (student_id, course_code, today))
+        record = cursor.fetchone()
+        conn.close()
+        if record is not None:
+            TodayAttendance.set(student_id, course_code, today, dict(record))
+
+class Dashboard:
+    # Seconds computed statistics are reused before being recomputed
+    CACHE_TTL_SECONDS = 5
+    
+    @staticmethod
+    def get_stats():
+        """
+        Get the admin dashboard statistics
+        
+        Totals come from COUNT(*) queries and only the latest records are
+        fetched, so the cost does not grow with the attendance history.
+        Results are cached for CACHE_TTL_SECONDS or until invalidate().
+        """
+        with _dashboard_lock:
+            if _dashboard_cache['stats'] is not None and time.monotonic() < _dashboard_cache['expires']:
+                return _dashboard_cache['stats']
+            generation = _dashboard_cache['generation']
+        
+        stats = {
+            'total_students': Student.count_students(),
+            'total_courses': Course.count_courses(),
+            'total_attendance': Attendance.count_attendance(),
+            'recent_attendance': [dict(row) for row in Attendance.get_recent_attendance(10)],
+            'today_by_course': [dict(row) for row in Attendance.get_today_counts_by_course()],
+        }
+        
+        # Don't cache results that a write invalidated while they were computed
+        with _dashboard_lock:
+            if _dashboard_cache['generation'] == generation:
+                _dashboard_cache['stats'] = stats
+                _dashboard_cache['expires'] = time.monotonic() + Dashboard.CACHE_TTL_SECONDS
+        return stats
+    
+    @staticmethod
+    def invalidate():
+        """Drop the cached statistics (called after attendance, student or course writes)"""
+        with _dashboard_lock:
+            _dashboard_cache['stats'] = None
+            _dashboard_cache['generation'] += 1
+
+class Settings:
+    """
+    Application settings from the settings table, cached in memory
+    
+    All rows are loaded at once and reused until the 'settings' row of
+    data_versions changes, which is probed at most every VERSION_CHECK_SECONDS,
+    so other processes' changes are picked up without querying on every call.
+    Keys missing from the table fall back to DEFAULTS.
+    """
+    
+    # Values used when a key is not in the settings table
+    DEFAULTS = {
+        'min_attendance_percentage': str(DEFAULT_MIN_ATTENDANCE_PERCENTAGE),
+        'default_min_duration_minutes': '45',
+    }
+    
+    # Seconds between checks for changes made by other processes
+    VERSION_CHECK_SECONDS = 1.0
+    
+    @staticmethod
+    def _load():
+        """Read every setting from the database"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, value FROM settings')
+        values = {row['key']: row['value'] for row in cursor.fetchall()}
+        conn.close()
+        return values
+    
+    @staticmethod
+    def get_all():
+        """Get all settings (defaults merged with the stored values)"""
+        # Reports read their snapshot's settings, bypassing the cache
+        if get_reporting_reader() is not None:
+            return {**Settings.DEFAULTS, **Settings._load()}
+        
+        with _settings_lock:
+            now = time.monotonic()
+            if _settings_cache['values'] is None or now - _settings_cache['checked'] >= Settings.VERSION_CHECK_SECONDS:
+                # Read the version before the rows, so a change in between triggers another load
+                version = get_data_versions(('settings',)).get('settings')
+                if _settings_cache['values'] is None or version != _settings_cache['version']:
+                    _settings_cache['values'] = Settings._load()
+                    _settings_cache['version'] = version
+                _settings_cache['checked'] = now
+            values = _settings_cache['values']
+        
+        return {**Settings.DEFAULTS, **values}
+    
+    @staticmethod
+    def get(key, default=None):
+        """Get one setting's value (as stored, i.e. a string)"""
+        return Settings.get_all().get(key, default)
+    
+    @staticmethod
+    def set(key, value):
+        """Store a setting; other processes see it after their next version check"""
+        with transaction() as conn:
+            conn.execute('''
+                INSERT INTO settings (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            ''', (key, str(value)))
+        Settings.invalidate()
+    
+    @staticmethod
+    def invalidate():
+        """Drop the cached settings so the next call reloads them"""
+        with _settings_lock:
+            _settings_cache['values'] = None
+    
+    @staticmethod
+    def get_min_attendance_percentage():
+        """Get minimum attendance percentage threshold"""
+        return int(Settings.get('min_attendance_percentage'))
+    
+    @staticmethod
+    def set_min_attendance_percentage(percentage):
+        """Set minimum attendance percentage threshold"""
+        Settings.set('min_attendance_percentage', percentage)
 
 class Admin:
     @staticmethod
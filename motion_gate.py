@@ -0,0 +1,91 @@
+"""
+Motion Gating Module
+Skips the expensive face pipeline on static frames (e.g. an empty hallway)
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Decides whether a frame is worth running detection on, using frame differencing"""
+    
+    # Width of the downscaled grayscale frame used for differencing
+    DOWNSCALE_WIDTH = 64
+    
+    # Grey-level change for a pixel to count as changed
+    PIXEL_DELTA = 15
+    
+    # Fraction of changed pixels that wakes the gate up
+    START_RATIO = 0.02
+    
+    # Fraction of changed pixels below which the scene counts as still
+    STOP_RATIO = 0.005
+    
+    # Seconds the gate stays open after the last motion
+    IDLE_SECONDS = 3.0
+    
+    # Seconds the gate stays open after a face was last seen
+    FACE_HOLD_SECONDS = 5.0
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        """Forget the previous frame and open the gate for the next one"""
+        self.previous = None
+        self.active = True
+        self.last_motion = time.monotonic()
+        self.last_face = None
+        self.change_ratio = 0.0
+    
+    def _downscale(self, frame):
+        """Shrink the frame to a tiny blurred grayscale image"""
+        height, width = frame.shape[:2]
+        size = (self.DOWNSCALE_WIDTH, max(1, round(height * self.DOWNSCALE_WIDTH / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+    
+    def note_face(self, timestamp=None):
+        """Keep the gate open for a while because a face is present"""
+        self.last_face = time.monotonic() if timestamp is None else timestamp
+    
+    def update(self, frame, timestamp=None):
+        """
+        Feed a frame and decide whether to run the full pipeline on it
+        
+        Args:
+            frame: Input video frame (BGR format from OpenCV)
+            timestamp: Capture time in seconds (defaults to the monotonic clock)
+        
+        Returns:
+            bool: True if the frame should be analyzed
+        """
+        now = time.monotonic() if timestamp is None else timestamp
+        small = self._downscale(frame)
+        
+        if self.previous is None or self.previous.shape != small.shape:
+            self.previous = small
+            self.active = True
+            self.last_motion = now
+            return True
+        
+        diff = cv2.absdiff(small, self.previous)
+        self.previous = small
+        self.change_ratio = float(np.count_nonzero(diff > self.PIXEL_DELTA)) / diff.size
+        
+        # Hysteresis: wake on a large change, stay awake while anything moves
+        if self.change_ratio >= (self.STOP_RATIO if self.active else self.START_RATIO):
+            self.active = True
+            self.last_motion = now
+        elif self.active:
+            face_recent = (self.last_face is not None
+                           and now - self.last_face < self.FACE_HOLD_SECONDS)
+            if now - self.last_motion >= self.IDLE_SECONDS and not face_recent:
+                self.active = False
+        
+        return self.active
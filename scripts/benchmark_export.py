@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Excel Export Benchmark
+Compares the write-only streaming export against the previous
+pandas + openpyxl (normal mode) export on a synthetic database.
+
+Usage:
+    python scripts/benchmark_export.py --rows 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add project root to path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import database
+from models import Attendance
+from export_utils import ATTENDANCE_COLUMNS, export_attendance_to_excel
+
+
+def seed_database(rows, students=500, courses=10):
+    """Fill a fresh database with about `rows` attendance records"""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO students (student_id, name, email) VALUES (?, ?, ?)',
+                       [(f'S{i:05d}', f'Student Number {i}', f'student{i}@example.com')
+                        for i in range(students)])
+    cursor.executemany('INSERT INTO courses (course_code, course_name) VALUES (?, ?)',
+                       [(f'C{i:03d}', f'Course Title {i}') for i in range(courses)])
+    
+    days = max(1, rows // (students * courses))
+    start = date.today() - timedelta(days=days)
+    cursor.executemany('''
+        INSERT INTO attendance (student_id, course_code, date, check_in_time,
+                                check_out_time, duration_minutes, status)
+        VALUES (?, ?, ?, '09:00:00', '10:00:00', 60, 'Present')
+    ''', ((f'S{s:05d}', f'C{c:03d}', (start + timedelta(days=d)).isoformat())
+          for d in range(days) for s in range(students) for c in range(courses)))
+    conn.commit()
+    return days * students * courses
+
+
+def legacy_export(filename):
+    """The previous implementation: list of dicts -> DataFrame -> workbook -> autosize"""
+    import pandas as pd
+    
+    records = Attendance.get_all_attendance()
+    df = pd.DataFrame([{header: record[field] for header, field in ATTENDANCE_COLUMNS}
+                       for record in records])
+    
+    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='All Attendance', index=False)
+        worksheet = writer.sheets['All Attendance']
+        for column in worksheet.columns:
+            max_length = 0
+            column = [cell for cell in column]
+            for cell in column:
+                try:
+                    if len(str(cell.value)) > max_length:
+                        max_length = len(cell.value)
+                except:
+                    pass
+            worksheet.column_dimensions[column[0].column_letter].width = max_length + 2
+
+
+def measure(name, func, filename, trace_memory):
+    """Time one export, then optionally measure its peak Python memory"""
+    start = time.perf_counter()
+    func(filename)
+    seconds = time.perf_counter() - start
+    
+    peak_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        func(filename)
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    
+    size_mb = os.path.getsize(filename) / (1024 * 1024)
+    peak = f"{peak_mb:8.1f} MB peak" if peak_mb is not None else ""
+    print(f"  {name:10} {seconds:8.2f}s  {peak}  ({size_mb:.1f} MB file)")
+    return seconds, peak_mb
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark the Excel attendance export")
+    parser.add_argument('--rows', type=int, default=100000, help="Approximate number of attendance rows")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database.DATABASE_PATH = os.path.join(temp_dir, 'benchmark.db')
+        database.init_db()
+        rows = seed_database(args.rows)
+        
+        print(f"\nExporting {rows} attendance rows...")
+        legacy = measure('legacy', legacy_export, os.path.join(temp_dir, 'legacy.xlsx'),
+                         not args.no_memory)
+        stream = measure('streaming', lambda f: export_attendance_to_excel(filename=f),
+                         os.path.join(temp_dir, 'stream.xlsx'), not args.no_memory)
+        
+        print(f"\nSpeedup: {legacy[0] / stream[0]:.2f}x")
+        if legacy[1] and stream[1]:
+            print(f"Peak memory: {legacy[1] / stream[1]:.1f}x lower")
+        
+        database.close_db_connection()
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
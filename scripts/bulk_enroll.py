@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Bulk Student Enrollment
+Enrolls a whole intake from a CSV manifest and a directory of images.
+Faces are encoded in a pool of worker processes and the students are
+inserted in batched transactions.
+
+The manifest needs student_id and name columns; email, phone and
+image_path are optional. image_path is relative to --images (an image or a
+folder of images); without it the student's image is looked up as
+<images>/<student_id> (folder) or <images>/<student_id>.jpg/.jpeg/.png.
+
+Every processed student is appended to a progress log once its batch is
+committed, so an interrupted run picks up where it stopped when run again.
+
+Usage:
+    python scripts/bulk_enroll.py students.csv --images photos/ [--workers 8] [--batch-size 200]
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add project root to path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import database
+from models import Student
+from face_recognition_module import encode_student_images
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def read_manifest(manifest, images_dir):
+    """
+    Read the manifest rows
+    
+    Returns:
+        list: dicts with student_id, name, email, phone and the resolved image path
+    """
+    students = []
+    with open(manifest, newline='', encoding='utf-8') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            student_id = (row.get('student_id') or '').strip()
+            name = (row.get('name') or '').strip()
+            if not student_id or not name:
+                print(f"  ⚠ Line {line}: student_id and name are required, skipped")
+                continue
+            
+            image_path = (row.get('image_path') or '').strip()
+            if image_path:
+                image_path = os.path.join(images_dir, image_path)
+            else:
+                image_path = os.path.join(images_dir, student_id)
+                for extension in IMAGE_EXTENSIONS:
+                    if not os.path.isdir(image_path) and os.path.isfile(image_path + extension):
+                        image_path += extension
+                        break
+            
+            students.append({
+                'student_id': student_id,
+                'name': name,
+                'email': (row.get('email') or '').strip() or None,
+                'phone': (row.get('phone') or '').strip() or None,
+                'image_path': image_path,
+            })
+    return students
+
+
+def read_progress(progress_log):
+    """Student ID -> status of every student finished by earlier runs"""
+    done = {}
+    if os.path.exists(progress_log):
+        with open(progress_log, encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) >= 2:
+                    done[fields[0]] = fields[1]
+    return done
+
+
+def commit_batch(batch, failures, progress):
+    """
+    Insert a batch of encoded students and log every student of the batch
+    
+    Returns:
+        int: Number of students added
+    """
+    added = set(Student.add_students_batch(
+        [(s['student_id'], s['name'], s['email'], s['phone'], s['image_path'], encoding)
+         for s, encoding in batch]))
+    
+    for student, _ in batch:
+        status = 'added' if student['student_id'] in added else 'exists'
+        progress.write(f"{student['student_id']}\t{status}\n")
+    for student, reason in failures:
+        progress.write(f"{student['student_id']}\tfailed\t{reason}\n")
+    progress.flush()
+    os.fsync(progress.fileno())
+    return len(added)
+
+
+def main():
+    """Enroll the students of a manifest"""
+    parser = argparse.ArgumentParser(description="Enroll many students from a CSV manifest")
+    parser.add_argument('manifest', help="CSV file with student_id, name[, email, phone, image_path]")
+    parser.add_argument('--images', default='.', help="Directory the image paths are relative to")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Encoding processes")
+    parser.add_argument('--batch-size', type=int, default=200, help="Students inserted per transaction")
+    parser.add_argument('--progress-log', help="Progress log (default: <manifest>.progress)")
+    parser.add_argument('--retry-failed', action='store_true', help="Retry students that failed before")
+    parser.add_argument('--database', help="Database file (default: the application database)")
+    args = parser.parse_args()
+    
+    if args.database:
+        database.DATABASE_PATH = args.database
+    database.init_db()
+    
+    progress_log = args.progress_log or f"{args.manifest}.progress"
+    done = read_progress(progress_log)
+    if args.retry_failed:
+        done = {student_id: status for student_id, status in done.items() if status != 'failed'}
+    
+    students = read_manifest(args.manifest, args.images)
+    existing = {row['student_id'] for row in Student.get_all_students()}
+    pending = [s for s in students if s['student_id'] not in done and s['student_id'] not in existing]
+    database.close_db_connection()
+    
+    print(f"{len(students)} student(s) in manifest: {len(students) - len(pending)} already enrolled or "
+          f"processed, {len(pending)} to enroll with {args.workers} worker(s)")
+    if not pending:
+        return 0
+    
+    added = failed = 0
+    started = time.monotonic()
+    with open(progress_log, 'a', encoding='utf-8') as progress, \
+            ProcessPoolExecutor(max_workers=args.workers) as executor:
+        batch, failures = [], []
+        # Encoded in the workers, handed back in manifest order
+        encodings = executor.map(encode_student_images, [s['image_path'] for s in pending], chunksize=4)
+        for count, (student, encoding) in enumerate(zip(pending, encodings), start=1):
+            if encoding is None:
+                reason = 'no face found' if os.path.exists(student['image_path']) else 'image not found'
+                failures.append((student, reason))
+            else:
+                batch.append((student, encoding))
+            
+            if len(batch) + len(failures) >= args.batch_size or count == len(pending):
+                added += commit_batch(batch, failures, progress)
+                failed += len(failures)
+                batch, failures = [], []
+                elapsed = time.monotonic() - started
+                print(f"  {count}/{len(pending)} processed ({count / elapsed:.1f}/s), "
+                      f"{added} added, {failed} failed")
+    
+    database.close_db_connection()
+    print(f"\n✅ Enrolled {added} student(s) in {time.monotonic() - started:.1f}s; "
+          f"{failed} failed (see {progress_log})")
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
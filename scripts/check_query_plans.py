@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check
+Runs the hot read paths in models.py and asserts with EXPLAIN QUERY PLAN
+that every table access uses an index (apart from reading the small
+attendance_summary table in full) and no result needs a temporary sort.
+
+By default the check runs against a throwaway database created with the
+current schema and a small synthetic data set; pass --database to check an
+existing database file instead.
+
+Usage:
+    python scripts/check_query_plans.py [--database attendance_system.db]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add project root to path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import database
+from models import Attendance, TodayAttendance
+
+
+def hot_queries(student_id, course_code):
+    """The model calls behind the attendance pages, reports and exports"""
+    return [
+        ('Attendance.get_attendance_by_course', lambda: Attendance.get_attendance_by_course(course_code)),
+        ('Attendance.get_attendance_by_student', lambda: Attendance.get_attendance_by_student(student_id)),
+        ('Attendance.get_all_attendance', lambda: Attendance.get_all_attendance()),
+        ('Attendance.get_student_attendance_percentage',
+         lambda: Attendance.get_student_attendance_percentage(student_id, course_code)),
+        ('Attendance.get_attendance_percentages (student)',
+         lambda: Attendance.get_attendance_percentages(student_id=student_id)),
+        ('Attendance.get_attendance_percentages (course)',
+         lambda: Attendance.get_attendance_percentages(course_code=course_code)),
+        ('Attendance.get_present_counts', lambda: Attendance.get_present_counts()),
+        ('TodayAttendance.warm', lambda: TodayAttendance.warm()),
+        ('TodayAttendance.reload', lambda: TodayAttendance.reload(student_id, course_code)),
+        ('Attendance.get_attendance_page', lambda: Attendance.get_attendance_page()),
+        ('Attendance.get_attendance_page (next page)',
+         lambda: Attendance.get_attendance_page(after=(date.today().isoformat(), '09:00:00', 10**9))),
+        ('Attendance.get_attendance_page (course)', lambda: Attendance.get_attendance_page(course_code=course_code)),
+        ('Attendance.get_attendance_page (student)', lambda: Attendance.get_attendance_page(student_id=student_id)),
+        ('Attendance.get_recent_attendance', lambda: Attendance.get_recent_attendance(10)),
+        ('Attendance.get_today_counts_by_course', lambda: Attendance.get_today_counts_by_course()),
+    ]
+
+
+def seed_database(conn, students=50, courses=5, days=30):
+    """Fill an empty database with enough rows for the planner to prefer indexes"""
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO students (student_id, name) VALUES (?, ?)',
+                       [(f'S{i:04d}', f'Student {i}') for i in range(students)])
+    cursor.executemany('INSERT INTO courses (course_code, course_name) VALUES (?, ?)',
+                       [(f'C{i:02d}', f'Course {i}') for i in range(courses)])
+    start = date.today() - timedelta(days=days)
+    cursor.executemany('''
+        INSERT INTO attendance (student_id, course_code, date, check_in_time, status)
+        VALUES (?, ?, ?, '09:00:00', 'Present')
+    ''', [(f'S{s:04d}', f'C{c:02d}', (start + timedelta(days=d)).isoformat())
+          for s in range(students) for c in range(courses) for d in range(days)])
+    database.rebuild_attendance_summary(cursor)
+    cursor.execute('ANALYZE')
+    conn.commit()
+
+
+def capture_statements(call):
+    """Run a model call and return the SELECT statements it executed"""
+    statements = []
+    conn = database.get_db_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+
+# Tables that may be read in full: their size is bounded by students x courses,
+# not by the attendance history
+FULL_SCAN_ALLOWED = ('attendance_summary',)
+
+
+def plan_problems(conn, sql):
+    """Return the plan lines showing a full scan or a temporary sort"""
+    problems = []
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'):
+        detail = row[-1]
+        if detail.startswith('SCAN') and detail.split()[1] in FULL_SCAN_ALLOWED:
+            continue
+        if detail.startswith('SCAN') and 'INDEX' not in detail:
+            problems.append(detail)
+        elif 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+def main():
+    """Check every hot query plan"""
+    parser = argparse.ArgumentParser(description="Assert that hot queries in models.py use indexes")
+    parser.add_argument('--database', help="Existing database to check (default: synthetic database)")
+    args = parser.parse_args()
+    
+    temp_dir = None
+    if args.database:
+        database.DATABASE_PATH = args.database
+    else:
+        temp_dir = tempfile.TemporaryDirectory()
+        database.DATABASE_PATH = os.path.join(temp_dir.name, 'query_plans.db')
+        database.init_db()
+        seed_database(database.get_db_connection())
+    
+    conn = database.get_db_connection()
+    student = conn.execute('SELECT student_id FROM attendance LIMIT 1').fetchone()
+    if student is None:
+        print("❌ The database has no attendance rows to check against")
+        return 1
+    course = conn.execute('SELECT course_code FROM attendance WHERE student_id = ? LIMIT 1',
+                          (student[0],)).fetchone()
+    
+    failures = 0
+    for name, call in hot_queries(student[0], course[0]):
+        for sql in capture_statements(call):
+            problems = plan_problems(conn, sql)
+            if problems:
+                failures += 1
+                print(f"  ✗ {name}: {'; '.join(problems)}")
+                print(f"      {' '.join(sql.split())}")
+            else:
+                print(f"  ✓ {name}")
+    
+    database.close_db_connection()
+    if temp_dir is not None:
+        temp_dir.cleanup()
+    
+    if failures:
+        print(f"\n❌ {failures} query plan(s) without index use")
+        return 1
+    
+    print("\n✅ All hot queries use indexes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
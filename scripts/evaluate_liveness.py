@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Offline Liveness Evaluation Harness
+Runs LivenessDetector over a directory of labeled clips and reports blink
+detection accuracy together with throughput and per-frame latency.
+
+By default each frame goes through the pipeline the application runs: the
+face is located with face_recognition and blinks are detected on the
+largest face box only (detect_blink_in_roi). --mode full scores the
+full-frame detect_blink() instead. Per-frame latency covers the liveness
+step only, since the face location is shared with recognition.
+
+Expected layout (one sub-directory per label):
+    
+    clips/
+        live/    - real people blinking naturally (should pass)
+        photo/   - printed photo attacks (should fail)
+        screen/  - phone/monitor replay attacks (should fail)
+
+Usage:
+    python scripts/evaluate_liveness.py clips/ --workers 4 --min-accuracy 0.95
+    python scripts/evaluate_liveness.py clips/ --smoothing-window 3 --min-closed-seconds 0.08
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add project root to path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+LABELS = ('live', 'photo', 'screen')
+MODES = ('roi', 'full')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+
+def find_clips(clips_dir):
+    """Collect (path, label) pairs from the label sub-directories"""
+    clips = []
+    for label in LABELS:
+        label_dir = Path(clips_dir) / label
+        if not label_dir.is_dir():
+            continue
+        for path in sorted(label_dir.iterdir()):
+            if path.suffix.lower() in VIDEO_EXTENSIONS:
+                clips.append((str(path), label))
+    return clips
+
+
+def _init_worker(model_path):
+    """Load the models once per worker so load time is not counted as latency"""
+    import importlib
+    from liveness_detection import load_liveness_models
+    importlib.import_module('face_recognition')  # Loads the face location models
+    load_liveness_models(model_path)
+
+
+def evaluate_clip(path, label, params):
+    """
+    Run blink detection over every frame of a clip
+    
+    Returns:
+        dict: clip results including the per-frame latencies in milliseconds
+    """
+    import cv2
+    import face_recognition
+    from face_recognition_module import largest_face
+    from liveness_detection import LivenessDetector
+    
+    detector = LivenessDetector(params['model_path'])
+    detector.EAR_THRESHOLD = params['ear_threshold']
+    detector.EAR_CONSEC_FRAMES = params['consec_frames']
+    detector.EAR_SMOOTHING_WINDOW = params['smoothing_window']
+    detector.EAR_MIN_CLOSED_SECONDS = params['min_closed_seconds']
+    
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    
+    latencies = []
+    frame_index = 0
+    while True:
+        success, frame = capture.read()
+        if not success:
+            break
+        
+        # Use the clip's own timeline so duration-based settings behave as live
+        timestamp = frame_index / fps
+        frame_index += 1
+        
+        if params['mode'] == 'roi':
+            # As in FaceRecognitionSystem: locate faces, check the largest one
+            face_locations = face_recognition.face_locations(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if not face_locations:
+                continue
+            start = time.perf_counter()
+            detector.detect_blink_in_roi(frame, largest_face(face_locations), timestamp=timestamp, draw=False)
+        else:
+            start = time.perf_counter()
+            detector.detect_blink(frame, timestamp=timestamp, draw=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    capture.release()
+    
+    return {
+        'path': path,
+        'label': label,
+        'frames': frame_index,
+        'blinks': detector.total_blinks,
+        'predicted_live': detector.total_blinks >= params['min_blinks'],
+        'expected_live': label == 'live',
+        'latencies_ms': latencies,
+    }
+
+
+def summarize(results, wall_seconds):
+    """Aggregate clip results into accuracy and speed metrics"""
+    import numpy as np
+    
+    latencies = np.array([ms for r in results for ms in r['latencies_ms']], dtype=np.float64)
+    correct = [r['predicted_live'] == r['expected_live'] for r in results]
+    
+    per_label = {}
+    for label in LABELS:
+        label_results = [c for r, c in zip(results, correct) if r['label'] == label]
+        if label_results:
+            per_label[label] = {
+                'clips': len(label_results),
+                'accuracy': sum(label_results) / len(label_results),
+            }
+    
+    total_frames = int(latencies.size)
+    summary = {
+        'clips': len(results),
+        'accuracy': sum(correct) / len(correct) if correct else 0.0,
+        'per_label': per_label,
+        'false_accepts': sum(1 for r in results if r['predicted_live'] and not r['expected_live']),
+        'false_rejects': sum(1 for r in results if r['expected_live'] and not r['predicted_live']),
+        'frames': total_frames,
+        'fps_per_worker': total_frames / (latencies.sum() / 1000) if total_frames else 0.0,
+        'fps_overall': total_frames / wall_seconds if wall_seconds > 0 else 0.0,
+        'latency_ms': {},
+    }
+    
+    if total_frames:
+        for p in (50, 90, 95, 99):
+            summary['latency_ms'][f'p{p}'] = float(np.percentile(latencies, p))
+        summary['latency_ms']['max'] = float(latencies.max())
+    
+    return summary
+
+
+def print_report(summary, results, params):
+    """Print a human-readable report"""
+    print("\n" + "=" * 70)
+    print("  Liveness Evaluation Report")
+    print("=" * 70)
+    print(f"\nSettings: mode={params['mode']}, EAR_THRESHOLD={params['ear_threshold']}, "
+          f"EAR_CONSEC_FRAMES={params['consec_frames']}, EAR_SMOOTHING_WINDOW={params['smoothing_window']}, "
+          f"EAR_MIN_CLOSED_SECONDS={params['min_closed_seconds']}, min_blinks={params['min_blinks']}")
+    
+    print("\nClips:")
+    for r in results:
+        mark = "✓" if r['predicted_live'] == r['expected_live'] else "✗"
+        print(f"  {mark} [{r['label']:6}] {os.path.basename(r['path'])}: "
+              f"{r['blinks']} blink(s), {r['frames']} frames")
+    
+    print(f"\nAccuracy: {summary['accuracy']:.2%} over {summary['clips']} clips")
+    for label, stats in summary['per_label'].items():
+        print(f"  - {label}: {stats['accuracy']:.2%} ({stats['clips']} clips)")
+    print(f"  False accepts: {summary['false_accepts']}, false rejects: {summary['false_rejects']}")
+    
+    print(f"\nThroughput: {summary['fps_per_worker']:.1f} FPS per worker, "
+          f"{summary['fps_overall']:.1f} FPS overall ({summary['frames']} frames)")
+    if summary['latency_ms']:
+        latency = ", ".join(f"{k}={v:.1f}ms" for k, v in summary['latency_ms'].items())
+        print(f"Per-frame latency: {latency}")
+    print("\n" + "=" * 70)
+
+
+def check_gates(summary, args):
+    """Return a list of failed regression gates"""
+    failures = []
+    if args.min_accuracy is not None and summary['accuracy'] < args.min_accuracy:
+        failures.append(f"accuracy {summary['accuracy']:.2%} < {args.min_accuracy:.2%}")
+    if args.min_fps is not None and summary['fps_per_worker'] < args.min_fps:
+        failures.append(f"FPS {summary['fps_per_worker']:.1f} < {args.min_fps}")
+    p95 = summary['latency_ms'].get('p95')
+    if args.max_p95_ms is not None and p95 is not None and p95 > args.max_p95_ms:
+        failures.append(f"p95 latency {p95:.1f}ms > {args.max_p95_ms}ms")
+    return failures
+
+
+def main():
+    """Run the evaluation"""
+    from liveness_detection import LivenessDetector, SHAPE_PREDICTOR_PATH
+    
+    parser = argparse.ArgumentParser(description="Evaluate liveness detection on recorded clips")
+    parser.add_argument('clips_dir', help="Directory with live/, photo/ and screen/ sub-directories")
+    parser.add_argument('--model', default=SHAPE_PREDICTOR_PATH, help="Shape predictor model path")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--mode', choices=MODES, default='roi',
+                        help="roi: blink detection on the located face box, as the app runs it (default); "
+                             "full: full-frame detect_blink()")
+    parser.add_argument('--ear-threshold', type=float, default=LivenessDetector.EAR_THRESHOLD)
+    parser.add_argument('--consec-frames', type=int, default=LivenessDetector.EAR_CONSEC_FRAMES)
+    parser.add_argument('--smoothing-window', type=int, default=LivenessDetector.EAR_SMOOTHING_WINDOW,
+                        help="EAR samples averaged before thresholding")
+    parser.add_argument('--min-closed-seconds', type=float, default=LivenessDetector.EAR_MIN_CLOSED_SECONDS,
+                        help="Minimum eye-closed duration for a blink (instead of --consec-frames)")
+    parser.add_argument('--min-blinks', type=int, default=1, help="Blinks required to pass as live")
+    parser.add_argument('--min-accuracy', type=float, help="Fail if accuracy is below this (0-1)")
+    parser.add_argument('--min-fps', type=float, help="Fail if per-worker FPS is below this")
+    parser.add_argument('--max-p95-ms', type=float, help="Fail if p95 frame latency exceeds this")
+    parser.add_argument('--json', dest='json_path', help="Also write the summary as JSON to this file")
+    args = parser.parse_args()
+    
+    clips = find_clips(args.clips_dir)
+    if not clips:
+        print(f"❌ No clips found under {args.clips_dir} (expected {', '.join(LABELS)} sub-directories)")
+        return 1
+    
+    params = {
+        'model_path': args.model,
+        'mode': args.mode,
+        'ear_threshold': args.ear_threshold,
+        'consec_frames': args.consec_frames,
+        'smoothing_window': args.smoothing_window,
+        'min_closed_seconds': args.min_closed_seconds,
+        'min_blinks': args.min_blinks,
+    }
+    
+    print(f"Evaluating {len(clips)} clips with {args.workers} worker(s)...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.model,)) as pool:
+        futures = [pool.submit(evaluate_clip, path, label, params) for path, label in clips]
+        results = [future.result() for future in futures]
+    wall_seconds = time.perf_counter() - start
+    
+    summary = summarize(results, wall_seconds)
+    print_report(summary, results, params)
+    
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'params': params, 'summary': summary}, f, indent=2)
+    
+    failures = check_gates(summary, args)
+    if failures:
+        print("\n❌ Regression gate failed:")
+        for failure in failures:
+            print(f"   - {failure}")
+        return 1
+    
+    print("\n✅ All regression gates passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Attendance Summary Rebuild
+Recomputes the attendance_summary table from the attendance table, e.g.
+after attendance rows were edited by hand or restored from a backup.
+
+With --verify the summary is only compared against the attendance table
+and the differences are listed; nothing is written.
+
+Usage:
+    python scripts/rebuild_attendance_summary.py [--database attendance_system.db] [--verify]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add project root to path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import database
+
+
+def expected_summary(cursor):
+    """The summary rows as computed from the attendance table"""
+    cursor.execute(database.ATTENDANCE_SUMMARY_QUERY)
+    return {(row[0], row[1]): tuple(row[2:]) for row in cursor.fetchall()}
+
+
+def stored_summary(cursor):
+    """The summary rows currently stored"""
+    cursor.execute('SELECT student_id, course_code, attended, left_early, last_seen FROM attendance_summary')
+    return {(row[0], row[1]): tuple(row[2:]) for row in cursor.fetchall()}
+
+
+def main():
+    """Rebuild or verify the attendance summary"""
+    parser = argparse.ArgumentParser(description="Rebuild the attendance_summary table")
+    parser.add_argument('--database', help="Database file (default: the application database)")
+    parser.add_argument('--verify', action='store_true', help="Only report differences, don't rebuild")
+    args = parser.parse_args()
+    
+    if args.database:
+        database.DATABASE_PATH = args.database
+    
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    database.create_attendance_summary(cursor)
+    conn.commit()
+    
+    if args.verify:
+        expected = expected_summary(cursor)
+        stored = stored_summary(cursor)
+        differences = sorted(key for key in expected.keys() | stored.keys()
+                             if expected.get(key) != stored.get(key))
+        
+        for student_id, course_code in differences:
+            print(f"  ✗ {student_id} / {course_code}: stored {stored.get((student_id, course_code))}, "
+                  f"expected {expected.get((student_id, course_code))}")
+        
+        database.close_db_connection()
+        if differences:
+            print(f"\n❌ {len(differences)} summary row(s) out of date; run without --verify to rebuild")
+            return 1
+        print(f"\n✅ Attendance summary matches ({len(expected)} rows)")
+        return 0
+    
+    with database.transaction() as conn:
+        rows = database.rebuild_attendance_summary(conn.cursor())
+    database.close_db_connection()
+    
+    print(f"✅ Attendance summary rebuilt ({rows} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())